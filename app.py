@@ -1,426 +1,317 @@
 import streamlit as st
-import hashlib
-from sqlalchemy import text
-from fpdf import FPDF
-from PIL import Image
-import pandas as pd
-import io, zipfile, os
-from datetime import datetime, date
+import auth
+import db
+from assets import ORG_ASSETS
+from archives import archive_reader, discard_archive, new_archive_path
+from jobs import ACTIVE_STATUSES, job_store, save_job_input, submit_job
+from verification import verify_certificate
+from metrics import METRICS_ENABLED, new_batch, registry
+import os, time
+from datetime import datetime
+
+# pandas and the PDF stack (pipeline, batch, rendering, fpdf) are imported
+# inside the pages that use them, so the login and register pages load
+# without them. See benchmarks/bench_startup.py for the import budget.
 
 # ---------- MYSQL USER AUTHENTICATION ----------
+# Password hashing and session tokens live in auth.py. The signed token is
+# kept in the ?session= query parameter, so a browser reload logs back in
+# without touching the database. A URL can be copied or bookmarked, so the
+# token is short-lived and renewed while the session is in use, it is
+# stripped from verification links, and logging out revokes every token and
+# open session of the user (in this process; see auth.py).
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+SESSION_PARAM = "session"
 
 def register_user(username, email, password):
-    conn = st.connection("mysql", type="sql")
-    password_hash = hash_password(password)
+    password_hash = auth.hash_password(password)
     try:
-        with conn.session as session:
-            session.execute(
-                text("INSERT INTO users (username, email, password_hash) VALUES (:username, :email, :password_hash)"),
-                {"username": username, "email": email, "password_hash": password_hash}
-            )
-            session.commit()
+        db.get_storage().create_user(username, email, password_hash)
         st.success("Registration successful! Please log in.")
     except Exception as e:
         st.error(f"Registration failed: {e}")
 
 def login_user(username, password):
-    conn = st.connection("mysql", type="sql")
-    password_hash = hash_password(password)
-    result = conn.query(
-        "SELECT * FROM users WHERE username = :username AND password_hash = :password_hash",
-        params={"username": username, "password_hash": password_hash},
-        ttl="0"
-    )
-    return len(result) > 0
+    """Return the user's id if the credentials are valid, else None."""
+    user_id = auth.authenticate(username, password)
+    if user_id is not None:
+        start_session(username, user_id)
+        st.query_params[SESSION_PARAM] = auth.issue_session_token(username, user_id)
+    return user_id
+
+def start_session(username, user_id):
+    st.session_state['logged_in'] = True
+    st.session_state['username'] = username
+    st.session_state['session_epoch'] = auth.session_epoch(user_id)
+    st.session_state.setdefault('user_ids', {})[username] = user_id
+
+def end_session(revoke=True):
+    user_id = st.session_state.get('user_ids', {}).get(st.session_state.get('username'))
+    if revoke and user_id is not None:
+        auth.revoke_sessions(user_id)
+    st.session_state['logged_in'] = False
+    st.session_state.pop('session_epoch', None)
+    st.query_params.pop(SESSION_PARAM, None)
+
+def resume_session():
+    """Log in from a valid session token in the URL; drop an invalid or expired one."""
+    token = st.query_params.get(SESSION_PARAM)
+    if token is None:
+        return
+    session = auth.verify_session_token(token)
+    if session is None:
+        del st.query_params[SESSION_PARAM]
+    else:
+        start_session(*session)
+
+def check_session():
+    """Log out a session revoked by a logout elsewhere; renew its token when due."""
+    epoch = st.session_state.get('session_epoch')
+    user_id = st.session_state.get('user_ids', {}).get(st.session_state['username'])
+    if epoch is not None and auth.session_epoch(user_id) != epoch:
+        end_session(revoke=False)
+        return
+    token = auth.renew_session_token(st.query_params.get(SESSION_PARAM))
+    if token is not None:
+        st.query_params[SESSION_PARAM] = token
 
 def get_user_id(username):
-    conn = st.connection("mysql", type="sql")
-    result = conn.query("SELECT id FROM users WHERE username = :username", params={"username": username})
-    if not result.empty:
-        return result.iloc[0]['id']
-    else:
-        return None
-
-# ---------- STATIC ASSET PATHS ----------
-
-ORG_ASSETS = {
-    "DLithe": {
-        "logo": "dlithe_logo.png",
-        "seal": "dlithe_seal.png",
-        "signature": "dlithe_signature.jpg"
-    },
-    "nxtAlign": {
-        "logo": "nxtalign_logo.png",
-        "seal": "nxtalign_seal.png",
-        "signature": "nxtalign_signature.jpg"
-    }
-}
-
-# ---------- DOMAIN SHORTFORMS ----------
-
-DOMAIN_SHORTFORMS = {
-    "Python Fullstack": "PY",
-    "Web Development": "WD",
-    "Cybersecurity": "CS",
-    "Java Full Stack": "JFSD",
-    "Artificial Intelligence": "AIML",
-    "Internet of Things":"IOT"
-}
-
-# ---------- FLEXIBLE COLUMN MAPPING AND DATE FIX ----------
-
-EXPECTED_COLUMNS = {
-    "Prefix":["Prefix","prefix"],
-    "Name": ["Name", "Full Name", "Student Name"],
-    "USN": ["USN", "University Serial Number", "ID"],
-    "College": ["College", "Institution", "University"],
-    "Email": ["Email", "Email Address", "E-mail"],
-    "Phone": ["Phone", "Phone Number", "Contact"],
-    "Registered": ["Registered", "Registration Date"],
-    "Start Date": ["Start Date", "Internship Start", "Start"],
-    "End Date": ["End Date", "Internship End", "End"],
-    "Program": ["Program", "Course", "Internship Program"],
-    "Mode": ["Mode", "Internship Mode"],
-    "Payment Status": ["Payment Status", "Payment", "Paid"],
-    "Certificate Issued Date": ["Certificate Issued Date", "Issue Date", "Cert Date"],
-    "Intern ID": ["Intern ID", "ID", "Internship ID"],
-    "Topic": ["Topic", "Project Topic", "Internship Topic"],
-    "Certificate ID": ["Certificate ID", "Cert ID", "Certificate Number"],
-    "Domain": ["Domain", "Internship Domain", "Course Domain"]
-}
-
-def parse_date_safe(val):
-    if val is None or (isinstance(val, float) and pd.isna(val)) or str(val).strip() == "":
-        return None
+    # Cached for the session, so reruns of the logged-in pages skip the lookup.
+    user_ids = st.session_state.setdefault('user_ids', {})
+    if username not in user_ids:
+        user_ids[username] = db.get_storage().find_user_id(username)
+    return user_ids[username]
+
+def org_dropdown(label="Organization"):
+    return st.selectbox(label, list(ORG_ASSETS.keys()))
+
+def domain_dropdown(label="Domain"):
+    from pipeline import DOMAIN_SHORTFORMS
+    return st.selectbox(label, list(DOMAIN_SHORTFORMS.keys()))
+
+# Output formats, as batch.OUTPUT_FORMATS keys; "pdf" merges the whole batch
+# into one printable PDF.
+OUTPUT_FORMAT_OPTIONS = {"ZIP of individual PDFs": "zip", "One merged PDF (for printing)": "pdf"}
+
+def output_format_picker():
+    return OUTPUT_FORMAT_OPTIONS[st.radio("Output", list(OUTPUT_FORMAT_OPTIONS), horizontal=True)]
+
+def archive_kind(file_name):
+    """Return (label, mime type) for a generated archive's download button."""
+    if file_name.endswith(".pdf"):
+        return "PDF", "application/pdf"
+    return "ZIP", "application/zip"
+
+def generate_certificates_for_approved(user_id, org, sig_path, seal_path, logo_path, new_only=False, output_format="zip"):
+    metrics = new_batch("approved", label=org)
     try:
-        dt = pd.to_datetime(val, dayfirst=True, errors='coerce')
-        if pd.isna(dt):
-            return None
-        return dt.strftime("%Y-%m-%d")
-    except Exception:
-        return None
-
-def map_and_clean_columns(df):
-    mapped_df = pd.DataFrame()
-    for standard_col, aliases in EXPECTED_COLUMNS.items():
-        found = None
-        for alias in aliases:
-            if alias in df.columns:
-                found = alias
-                break
-        if found:
-            mapped_df[standard_col] = df[found]
-        else:
-            mapped_df[standard_col] = None
-    mapped_df = mapped_df.where(pd.notnull(mapped_df), None)
-    for col in mapped_df.columns:
-        mapped_df[col] = mapped_df[col].apply(lambda x: str(x).strip() if isinstance(x, str) else x)
-    for date_col in ["Start Date", "End Date", "Certificate Issued Date"]:
-        if date_col in mapped_df.columns:
-            mapped_df[date_col] = mapped_df[date_col].apply(parse_date_safe)
-    return mapped_df
-
-def generate_certificate_id(domain_short, usn, date_obj, org):
-    month_short = date_obj.strftime("%b").upper()  # e.g., 'Jun' → 'JUN'
-    year_short = date_obj.strftime("%y")           # e.g., 2025 → '25'
-    if str(org).lower() == "nxtalign":
-        return f"NXT{domain_short}{usn}{month_short}{year_short}"
-    else:
-        return f"DL{domain_short}{usn}{month_short}{year_short}"
-
-def clean_text(text):
-    if not isinstance(text, str):
-        return ""
-    return (
-        text.replace("’", "'")
-            .replace("‘", "'")
-            .replace("“", '"')
-            .replace("”", '"')
-    )
+        export_approved_certificates(user_id, org, sig_path, seal_path, logo_path, new_only, metrics, output_format)
+    finally:
+        metrics.finish()
 
-def format_date(dt):
-    if isinstance(dt, str):
-        try:
-            dt = pd.to_datetime(dt).date()
-        except Exception:
-            return dt
-    if isinstance(dt, date) and not isinstance(dt, datetime):
-        dt = datetime(dt.year, dt.month, dt.day)
-    day = dt.day
-    if 4 <= day % 100 <= 20:
-        suffix = "th"
+def export_approved_certificates(user_id, org, sig_path, seal_path, logo_path, new_only, metrics, output_format="zip"):
+    from batch import OUTPUT_FORMATS, render_certificate_pages
+    from pipeline import format_date
+
+    with metrics.stage("db_query"):
+        results = db.get_storage().approved_certificates(user_id, org, new_only=new_only)
+
+    if not results:
+        st.warning("No new approved certificates to export." if new_only else "No approved certificates to generate.")
+        return
+    metrics.count("rows", len(results))
+
+    names = []
+    jobs = []
+    for row in results:
+        names.append(row["name"])
+        jobs.append(dict(
+            prefix=row["prefix"],
+            name=row["name"],
+            usn=row["usn"],
+            college=row["college"],
+            start_date_str=format_date(row["start_date"]),
+            end_date_str=format_date(row["end_date"]),
+            topic=row["topic"],
+            cert_id=row["certificate_id"],
+            org=org,
+            logo_path=logo_path,
+            signature_path=sig_path,
+            seal_path=seal_path,
+            cert_type="Final"
+        ))
+
+    previous = st.session_state.get('approved_export')
+    if previous:
+        discard_archive(previous["path"])
+    writer_class = OUTPUT_FORMATS[output_format]
+    zip_path = new_archive_path("approved_", writer_class.extension)
+    exported_ids = []
+    with writer_class(zip_path, metrics=metrics) as writer:
+        pages = render_certificate_pages(jobs, metrics=metrics)
+        for name, job, (template, content, asset_errors, error) in zip(names, jobs, pages):
+            for message in asset_errors:
+                st.error(message)
+            if error is not None:
+                metrics.count("errors")
+                st.error(f"Error generating certificate for {name}: {error}")
+                continue
+            pdf_filename = f"{name.replace(' ', '_')}_{job['cert_id']}.pdf"
+            writer.add(pdf_filename, template, content)
+            exported_ids.append(job["cert_id"])
+    metrics.count("certificates", len(exported_ids))
+
+    if new_only:
+        file_name = f"approved_certificates_new_{datetime.now():%Y%m%d_%H%M%S}{writer_class.extension}"
     else:
-        suffix = {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
-    return f"{day}{suffix} {dt:%B %Y}"
+        file_name = f"approved_certificates{writer_class.extension}"
+    st.session_state['approved_export'] = {
+        "path": zip_path,
+        "org": org,
+        "file_name": file_name,
+        "certificate_ids": exported_ids,
+    }
 
-def generate_certificate_pdf(
-    prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id,
-    org, logo_path=None, signature_path=None, seal_path=None, cert_type=None,
-    activity_type="Internship", duration="15 Weeks"
+def run_upload_job(
+    progress, csv_path, user_id, org, domain, cert_type, activity_type, duration,
+    include_unchanged=False, output_format="zip"
 ):
-    pdf = FPDF(unit='mm', format='A4')
-    pdf.set_auto_page_break(False)
-    pdf.add_page()
-    page_width = pdf.w
-    page_height = pdf.h
-
-    border_margin = 8
-    border_width = page_width - 2 * border_margin
-    border_height = page_height - 2 * border_margin
-    pdf.set_line_width(0.5)
-    pdf.set_draw_color(255,255,255)
-    pdf.rect(border_margin, border_margin, border_width, border_height)
-
-    left_margin = border_margin + 8
-    right_margin = border_margin + 8
-    top_margin = border_margin + 8
-    bottom_margin = border_margin + 8
-    pdf.set_left_margin(left_margin)
-    pdf.set_right_margin(right_margin)
-
-    current_y = top_margin
-
-    # Logo
-    if logo_path and os.path.exists(logo_path):
-        try:
-            logo_width = 35.0
-            logo_x = left_margin
-            logo_y = current_y
-            pdf.image(logo_path, x=logo_x, y=logo_y, w=logo_width)
-        except Exception as e:
-            st.error(f"Error loading logo image: {e}")
-
-    # Organization header
-    if org == "DLithe":
-        org_name = "DLithe Consultancy Services Pvt. Ltd."
-        org_cin = "CIN: U72900KA2019PTC121035"
-        org_footer1 = "           Registered office: #51, 1st Main, 6th Block, 3rd Phase, BSK 3rd Stage, Bangaluru -560085"
-        org_footer2 = "Development Centeres: Ujire | Moodabidre | Manipal | Mangaluru | Belagavi"
-        org_footer3 = "M: 9008815252 | www.dlithe.com | info@dlithe.com"
-        for_text = "For DLithe Consultancy Services Pvt. Ltd."
-    else:
-        org_name = "nxtAlign Innovation Pvt.Ltd."
-        org_cin = "CIN: U73100KA2022PTC165879"
-        org_footer1 = "           Registered office: H No.4061/B 01,Near Chidambar Ashram Health Camp Betageri,Gadag KA 582102"
-        org_footer2 = "Development Centeres: Ujire | AIC NITTE"
-        org_footer3 = "M: 8553300781 | www.nxtalign.com | nxtalign@gmail.com"
-        for_text = "For nxtAlign Innovation Pvt.Ltd."
-
-    pdf.set_xy(left_margin + 40, current_y)
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(page_width - left_margin - right_margin - 40, 8, org_name, align='R', ln=1)
-    pdf.set_font("Arial", "", 12)
-    pdf.set_x(left_margin + 40)
-    pdf.cell(page_width - left_margin - right_margin - 40, 6, org_cin, align='R', ln=1)
-    current_y += 18
-    pdf.set_y(current_y)
-    pdf.ln(8)
-    pdf.set_font("Arial", "", 12)
-    pdf.set_x(left_margin)
-    pdf.cell(0, 5, f"Certificate ID: {cert_id}", align='L')
-    issued_on_text = f"Issued on: {end_date_str}"
-    text_width = pdf.get_string_width(issued_on_text)
-    desired_x_position = page_width - right_margin - text_width
-    pdf.set_xy(desired_x_position, pdf.get_y())
-    pdf.cell(text_width, 5, issued_on_text, align='L')
-    pdf.ln(15)
-
-    # --- PROVISIONAL exactly above TO WHOMSOEVER ---
-    if cert_type and cert_type.lower() == "provisional":
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, "PROVISIONAL CERTIFICATE", align='C', ln=1)
-        pdf.ln(2)  # Small gap
-
-    # Main Heading
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "TO WHOMSOEVER IT MAY CONCERN", align='C', ln=1)
-    pdf.ln(10)
-
-    # Certificate Body (dynamic)
-    pdf.set_font("Arial", "", 12)
-    effective_width = page_width - left_margin - right_margin
-    pdf.set_x(left_margin)
-
-    if cert_type and cert_type.lower() == "provisional":
-        para1 = (
-            f"This is to certify {prefix}. {name}, bearing USN No: {usn} from {college}, "
-            f"is currently undergoing a {duration} {activity_type.lower()} starting from {start_date_str} "
-            f"to {end_date_str}, under the mentorship of {org}'s development team. "
-            f"{name} is working on {topic}.\n\n"
-            f"The domain & agile development process exposure was given along with usage of GitHub tool.\n\n"
-            f"During the {activity_type.lower()}, {name} demonstrated good coding skills with sound design thinking."
-        )
-    else:
-        para1 = (
-            f"This is to certify {prefix}. {name}, bearing USN No: {usn} from {college}, "
-            f"has successfully completed a {duration} {activity_type.lower()} starting from {start_date_str} "
-            f"to {end_date_str}, under the mentorship of {org}'s development team. "
-            f"{name} has worked on {topic}.\n\n"
-            f"The domain & agile development process exposure was given along with usage of GitHub tool.\n\n"
-            f"During the {activity_type.lower()}, {name} demonstrated good coding skills with sound design thinking."
-        )
+    """Background job: stream an uploaded CSV into one certificate ZIP (or merged PDF)."""
+    from batch import OUTPUT_FORMATS
+    from pipeline import archive_file_name, generate_certificates_from_csv
 
-    pdf.multi_cell(effective_width, 6, para1, align='J')
-    pdf.ln(6)
-    pdf.set_x(left_margin)
-    para3 = clean_text("We wish all the best for future endeavours!")
-    pdf.multi_cell(effective_width, 6, para3, align='J')
-
-    # --- Move Seal and Signature Higher ---
-    content_end_y = pdf.get_y()
-    min_sign_y = page_height - bottom_margin - 60  # 20mm higher than before
-    y_sign_start = max(content_end_y + 10, min_sign_y)
-
-    pdf.set_font("Arial", "", 12)
-    pdf.set_xy(page_width - right_margin - pdf.get_string_width(for_text), y_sign_start)
-    pdf.cell(pdf.get_string_width(for_text), 7, for_text, align='L')
-
-    # Seal (left)
-    if seal_path and os.path.exists(seal_path):
-        try:
-            seal_width = 30.0
-            pdf.image(seal_path, x=left_margin, y=y_sign_start, w=seal_width)
-        except Exception as e:
-            st.error(f"Error loading seal image: {e}")
-
-    # Signature (right)
-    sign_height = 0.0
-    sign_y = y_sign_start + 6.0
-    sign_width = 40.0
-    if signature_path and os.path.exists(signature_path):
-        try:
-            pdf.image(signature_path, x=page_width - right_margin - sign_width, y=sign_y, w=sign_width)
-            try:
-                img = Image.open(signature_path)
-                w_px, h_px = img.size
-                sign_height = (h_px / w_px) * sign_width
-            except:
-                sign_height = 15.0
-        except Exception as e:
-            st.error(f"Error loading signature image: {e}")
-
-    # Director label
-    director_y = sign_y + sign_height + 5.0
-    pdf.set_font("Arial", "", 12)
-    director_text_width = pdf.get_string_width("Director")
-    director_x = page_width - right_margin - sign_width + (sign_width - director_text_width) / 2
-    pdf.text(director_x, director_y, "Director")
-
-    # Footer
-    pdf.set_font("Arial", "", 9)
-    footer_y = page_height - bottom_margin - 10
-    pdf.set_y(footer_y)
-    pdf.set_x(0)
-    pdf.cell(0, 5, org_footer1, align='C', ln=1)
-    pdf.cell(0, 5, org_footer2, align='C', ln=1)
-    pdf.cell(0, 5, org_footer3, align='C', ln=1)
-
-    pdf_bytes = pdf.output(dest='S').encode('latin-1')
-    return pdf_bytes
-
-def insert_certificate_data(user_id, row, org):
-    conn = st.connection("mysql", type="sql")
-    table = f"certificate_data_{org}"
-    with conn.session as session:
-        session.execute(
-            text(f"""
-                INSERT INTO {table} (
-                    user_id, prefix, name, usn, college, email, phone, registered, start_date, end_date, program, mode, payment_status, certificate_issued_date, topic, domain, certificate_id, status
-                ) VALUES (
-                    :user_id, :prefix, :name, :usn, :college, :email, :phone, :registered, :start_date, :end_date, :program, :mode, :payment_status, :certificate_issued_date, :topic, :domain, :certificate_id, 'pending_review'
-                )
-            """),
-            {
-                "user_id": user_id,
-                "prefix": row["Prefix"],
-                "name": row["Name"],
-                "usn": row["USN"],
-                "college": row["College"],
-                "email": row["Email"],
-                "phone": row["Phone"],
-                "registered": row["Registered"],
-                "start_date": row["Start Date"],
-                "end_date": row["End Date"],
-                "program": row["Program"],
-                "mode": row["Mode"],
-                "payment_status": row["Payment Status"],
-                "certificate_issued_date": row["Certificate Issued Date"],
-                "topic": row["Topic"],
-                "domain": row.get("Domain", ""),
-                "certificate_id": row["Certificate ID"]
-            }
-        )
-        session.commit()
+    metrics = new_batch("upload", label=f"{org} {progress.job_id[:8]}")
 
+    def report_error(message):
+        metrics.count("errors")
+        progress.error(message)
 
-def org_dropdown(label="Organization"):
-    return st.selectbox(label, list(ORG_ASSETS.keys()))
+    extension = OUTPUT_FORMATS[output_format].extension
+    zip_path = new_archive_path(f"{org}_", extension)
+    size = os.path.getsize(csv_path)
+    try:
+        with open(csv_path, "rb") as f:
+            summary = generate_certificates_from_csv(
+                f, zip_path, user_id, org, domain, cert_type, activity_type, duration,
+                report_error=report_error, metrics=metrics, include_unchanged=include_unchanged,
+                output_format=output_format,
+                on_chunk=lambda rows: progress.advance(rows, min(f.tell() / max(size, 1), 1.0))
+            )
+    except Exception:
+        discard_archive(zip_path)
+        raise
+    finally:
+        os.remove(csv_path)
+        metrics.finish()
+
+    notes = []
+    if summary["updated"]:
+        notes.append(f"{summary['updated']} previously uploaded rows had changed and were updated.")
+    if summary["unchanged"]:
+        notes.append(f"{summary['unchanged']} rows were already uploaded unchanged" +
+                     ("; their certificates are in the download." if include_unchanged else " and were skipped."))
+    message = " ".join(notes) or None
+    progress.finish(zip_path, archive_file_name(org, summary["program_name"], extension), message)
+
+def show_upload_job(job_id, polling):
+    job = job_store.get(job_id)
+    if job is None:
+        return
+    if job["status"] in ACTIVE_STATUSES:
+        elapsed = time.time() - (job["started_at"] or time.time())
+        rate = job["processed"] / max(elapsed, 1e-9)
+        st.progress(job["progress"], text=f"Generating certificates... {job['processed']} rows processed ({rate:.0f} rows/s)")
+        return
+    if polling:
+        # Finished since the page was drawn: redraw it once without polling.
+        st.rerun()
+    for message in job_store.errors(job_id):
+        st.error(message)
+    if job["status"] == "failed":
+        st.error(f"Certificate generation failed: {job['message']}")
+        return
+    st.success("Certificates generated successfully!")
+    if job["message"]:
+        st.info(job["message"])
+    if job["archive_path"] and os.path.exists(job["archive_path"]):
+        kind, mime = archive_kind(job["file_name"])
+        st.download_button(
+            label=f"Download Certificates {kind}",
+            data=archive_reader(job["archive_path"]),
+            file_name=job["file_name"],
+            mime=mime
+        )
 
-def domain_dropdown(label="Domain"):
-    return st.selectbox(label, list(DOMAIN_SHORTFORMS.keys()))
+ADMIN_USERS = {name.strip() for name in os.environ.get("CERT_ADMIN_USERS", "").split(",") if name.strip()}
+
+def metrics_panel():
+    with st.sidebar.expander("Pipeline metrics"):
+        if not METRICS_ENABLED:
+            st.caption("Metrics are disabled (CERT_METRICS=0).")
+            return
+        batches = registry.recent_batches()
+        if not batches:
+            st.caption("No batches finished yet.")
+        for batch in batches[:5]:
+            wall = max(batch["wall_seconds"], 1e-9)
+            started = datetime.fromtimestamp(batch["started_at"]).strftime("%H:%M:%S")
+            st.markdown(f"**{batch['flow']}** {batch['label'] or ''} at {started}, {wall:.2f}s")
+            st.dataframe(
+                [
+                    {"stage": name, "seconds": round(stage["seconds"], 3),
+                     "share": f"{stage['seconds'] / wall:.0%}", "calls": stage["calls"]}
+                    for name, stage in sorted(batch["stages"].items(), key=lambda item: -item[1]["seconds"])
+                ],
+                hide_index=True
+            )
+            st.caption(", ".join(f"{name}: {value}" for name, value in batch["counters"].items()))
+        st.download_button(
+            "Download Prometheus metrics", registry.prometheus_text(),
+            file_name="certificate_metrics.prom", mime="text/plain"
+        )
 
-def generate_certificates_for_approved(user_id, org, sig_path, seal_path, logo_path):
-    conn = st.connection("mysql", type="sql")
-    table = f"certificate_data_{org}"
-    results = conn.query(
-        f"SELECT * FROM {table} WHERE user_id = :user_id AND status = 'Review_Completed'",
-        params={"user_id": user_id}
-    )
+def verification_page():
+    from pipeline import format_date
 
-    if results.empty:
-        st.warning("No approved certificates to generate.")
+    st.header("Verify a Certificate")
+    certificate_id = st.text_input("Certificate ID", value=st.query_params.get("verify", ""))
+    if not certificate_id.strip():
         return
-
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
-        for _, row in results.iterrows():
-            prefix = row["prefix"]
-            name = row["name"]
-            usn = row["usn"]
-            college = row["college"]
-            topic = row["topic"]
-            cert_id = row["cert_id"]
-            start_date_str = format_date(row["start_date"])
-            end_date_str = format_date(row["end_date"])
-
-            
-            pdf_bytes = generate_certificate_pdf(
-                prefix=prefix,
-                name=name,
-                usn=usn,
-                college=college,
-                start_date_str=start_date_str,
-                end_date_str=end_date_str,
-                topic=topic,
-                cert_id=cert_id,
-                org=org,
-                logo_path=logo_path,
-                signature_path=sig_path,
-                seal_path=seal_path,
-                cert_type="Final"
-            )
-            pdf_filename = f"{name.replace(' ', '_')}_{cert_id}.pdf"
-            zipf.writestr(pdf_filename, pdf_bytes)
-
-    zip_buffer.seek(0)
-    st.download_button(
-        label="Download Approved Certificates ZIP",
-        data=zip_buffer,
-        file_name="approved_certificates.zip",
-        mime="application/zip"
+    record = verify_certificate(certificate_id, list(ORG_ASSETS.keys()))
+    if record is None:
+        st.error(f"No certificate found with ID {certificate_id.strip()}.")
+        return
+    if record["status"] == "Review_Completed":
+        st.success("Certificate verified.")
+    else:
+        st.info(f"Certificate found, status: {record['status']}.")
+    st.markdown(
+        f"**Name:** {record['name']}  \n"
+        f"**USN:** {record['usn']}  \n"
+        f"**College:** {record['college']}  \n"
+        f"**Organization:** {record['org']}  \n"
+        f"**Program:** {record['program'] or record['domain']}  \n"
+        f"**Topic:** {record['topic']}  \n"
+        f"**Period:** {format_date(record['start_date'])} to {format_date(record['end_date'])}"
     )
 
 def main():
     st.title("Certificate Generator")
 
+    # Verification links (?verify=<certificate id>) work without logging in.
+    if "verify" in st.query_params:
+        st.query_params.pop(SESSION_PARAM, None)
+        verification_page()
+        return
+
     if 'logged_in' not in st.session_state:
         st.session_state['logged_in'] = False
+        resume_session()
+    elif st.session_state['logged_in']:
+        check_session()
 
     if not st.session_state['logged_in']:
-        menu = st.sidebar.selectbox("Menu", ["Login", "Register"])
+        menu = st.sidebar.selectbox("Menu", ["Login", "Register", "Verify Certificate"])
         if menu == "Register":
             st.subheader("Create New Account")
             username = st.text_input("Username", key="reg_user")
@@ -434,26 +325,32 @@ def main():
             username = st.text_input("Username", key="login_user")
             password = st.text_input("Password", type="password", key="login_pass")
             if st.button("Login"):
-                if login_user(username, password):
-                    st.session_state['logged_in'] = True
-                    st.session_state['username'] = username
+                if login_user(username, password) is not None:
                     st.success("Login successful!")
                     st.rerun()
                 else:
                     st.error("Invalid username or password.")
+
+        elif menu == "Verify Certificate":
+            verification_page()
         return
 
     st.sidebar.success(f"Logged in as {st.session_state['username']}")
-    menu = st.sidebar.radio("Actions", ["Upload & Generate Certificates", "Download Approved Certificates", "Logout"])
+    if st.session_state['username'] in ADMIN_USERS:
+        metrics_panel()
+    menu = st.sidebar.radio("Actions", ["Upload & Generate Certificates", "Download Approved Certificates", "Verify Certificate", "Logout"])
 
     if menu == "Logout":
-        st.session_state['logged_in'] = False
+        end_session()
         st.rerun()
         return
 
     user_id = get_user_id(st.session_state['username'])
 
     if menu == "Upload & Generate Certificates":
+        import pandas as pd
+        from pipeline import CSV_CHUNK_ROWS, map_and_clean_columns
+
         st.header("Batch Upload & Certificate Generation")
 
         cert_type = st.radio("Certificate Type", ["Provisional", "Final"])
@@ -480,74 +377,35 @@ def main():
         uploaded_file = st.file_uploader("Upload Student Data (CSV)", type="csv")
 
 
-        if uploaded_file:
-            df = pd.read_csv(uploaded_file)
-            cleaned_df = map_and_clean_columns(df)
-            cleaned_df["Domain"] = domain
-            st.write("Mapped Data Preview:", cleaned_df.head())
-
-            generate_clicked = st.button("Generate Certificates")
-
-            if generate_clicked:
-                logo_path = ORG_ASSETS[org]["logo"]
-                sig_path = ORG_ASSETS[org]["signature"]
-                seal_path = ORG_ASSETS[org]["seal"]
-
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
-                    for _, row in cleaned_df.iterrows():
-                        try:
-                            cert_id = generate_certificate_id(
-                                DOMAIN_SHORTFORMS[domain],
-                                row["USN"],
-                                pd.to_datetime(row["End Date"]),
-                                org
-                            )
-                            pdf_bytes = generate_certificate_pdf(
-                                prefix=row["Prefix"],
-                                name=row["Name"],
-                                usn=row["USN"],
-                                college=row["College"],
-                                start_date_str=format_date(row["Start Date"]),
-                                end_date_str=format_date(row["End Date"]),
-                                topic=row["Topic"],
-                                cert_id=cert_id,
-                                org=org,
-                                logo_path=logo_path,
-                                signature_path=sig_path,
-                                seal_path=seal_path,
-                                cert_type=cert_type,
-                                activity_type=activity_type,
-                                duration=duration
-                            )
-                            pdf_filename = f"{row['Name'].replace(' ', '_')}_{cert_id}.pdf"
-                            zipf.writestr(pdf_filename, pdf_bytes)
-                            row["Certificate ID"] = cert_id
-                            insert_certificate_data(user_id, row, org)
-                        except Exception as e:
-                            st.error(f"Error generating certificate for {row['Name']}: {str(e)}")
-
-                zip_buffer.seek(0)
-
-                if "Program" in cleaned_df.columns and not cleaned_df["Program"].isnull().all():
-                    program_name = str(cleaned_df["Program"].iloc[0])
-                else:
-                    program_name = "Certificates"
+        job_id = st.session_state.get('upload_job')
+        job = job_store.get(job_id) if job_id else job_store.latest(st.session_state['username'])
+        active = job is not None and job["status"] in ACTIVE_STATUSES
 
-                now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-                zip_filename = f"{org}_{program_name}_{now_str}.zip".replace(" ", "_")
+        if uploaded_file:
+            # Only the first chunk is parsed on each rerun; the whole file is
+            # streamed chunk by chunk by the background job.
+            preview_df = map_and_clean_columns(pd.read_csv(uploaded_file, nrows=CSV_CHUNK_ROWS))
+            preview_df["Domain"] = domain
+            st.write("Mapped Data Preview:", preview_df.head())
+            include_unchanged = st.checkbox("Include certificates already uploaded unchanged in the download")
+            output_format = output_format_picker()
+
+            if st.button("Generate Certificates", disabled=active):
+                if job is not None:
+                    discard_archive(job["archive_path"])
+                csv_path = save_job_input(uploaded_file.getvalue())
+                job_id = submit_job(
+                    st.session_state['username'], run_upload_job,
+                    csv_path, user_id, org, domain, cert_type, activity_type, duration, include_unchanged, output_format
+                )
+                st.session_state['upload_job'] = job_id
+                st.rerun()
 
-                st.session_state['zip_buffer'] = zip_buffer.getvalue()
-                st.session_state['zip_filename'] = zip_filename
-                st.success("Certificates generated successfully!")
+        if job is not None:
+            st.fragment(show_upload_job, run_every=2 if active else None)(job["id"], active)
 
-            if 'zip_buffer' in st.session_state and st.session_state['zip_buffer']:
-                st.download_button(
-                    label="Download Certificates ZIP",
-                    data=st.session_state['zip_buffer'],
-                    file_name=st.session_state['zip_filename'],
-                    mime="application/zip"
-                )
+    elif menu == "Verify Certificate":
+        verification_page()
 
     elif menu == "Download Approved Certificates":
         st.header("Download Approved Certificates")
@@ -555,7 +413,25 @@ def main():
         logo_path = ORG_ASSETS[org]["logo"]
         sig_path = ORG_ASSETS[org]["signature"]
         seal_path = ORG_ASSETS[org]["seal"]
-        generate_certificates_for_approved(user_id, org, sig_path, seal_path, logo_path)
+        export_mode = st.radio("Export", ["New approvals only", "All approved"], horizontal=True)
+        output_format = output_format_picker()
+        if st.button("Prepare Download"):
+            generate_certificates_for_approved(
+                user_id, org, sig_path, seal_path, logo_path,
+                new_only=export_mode == "New approvals only", output_format=output_format
+            )
+
+        export = st.session_state.get('approved_export')
+        if export and export["org"] == org and os.path.exists(export["path"]):
+            kind, mime = archive_kind(export["file_name"])
+            st.download_button(
+                label=f"Download Approved Certificates {kind} ({len(export['certificate_ids'])})",
+                data=archive_reader(export["path"]),
+                file_name=export["file_name"],
+                mime=mime,
+                on_click=db.get_storage().mark_certificates_exported,
+                args=(user_id, org, export["certificate_ids"])
+            )
 
 if __name__ == "__main__":
     main()
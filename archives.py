@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+import zipfile
+
+# ---------- ON-DISK ZIP ARCHIVES ----------
+# Certificate ZIPs (and merged PDFs) are written straight to files under ARCHIVE_DIR as the
+# PDFs are produced, and sessions keep only the path. Old archives are
+# removed by age and, oldest first, whenever the directory exceeds its quota.
+
+ARCHIVE_DIR = os.environ.get(
+    "CERT_ARCHIVE_DIR", os.path.join(tempfile.gettempdir(), "certificate_archives")
+)
+ARCHIVE_MAX_AGE_SECONDS = int(os.environ.get("CERT_ARCHIVE_MAX_AGE_SECONDS", str(6 * 60 * 60)))
+ARCHIVE_MAX_TOTAL_BYTES = int(os.environ.get("CERT_ARCHIVE_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+ARCHIVE_SUFFIXES = (".zip", ".pdf")
+
+def _archive_files():
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return []
+    files = []
+    for name in names:
+        if not name.endswith(ARCHIVE_SUFFIXES):
+            continue
+        path = os.path.join(ARCHIVE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    return files
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def cleanup_archives(max_age_seconds=ARCHIVE_MAX_AGE_SECONDS, max_total_bytes=ARCHIVE_MAX_TOTAL_BYTES):
+    """Delete archives older than max_age_seconds, then the oldest ones until under max_total_bytes."""
+    cutoff = time.time() - max_age_seconds
+    remaining = []
+    for mtime, size, path in _archive_files():
+        if mtime < cutoff:
+            _remove(path)
+        else:
+            remaining.append((size, path))
+    total = sum(size for size, _ in remaining)
+    for size, path in remaining:
+        if total <= max_total_bytes:
+            break
+        _remove(path)
+        total -= size
+
+def new_archive_path(prefix="certificates_", suffix=".zip"):
+    """Reserve a fresh archive file under ARCHIVE_DIR, cleaning up old ones first."""
+    cleanup_archives()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=ARCHIVE_DIR)
+    os.close(fd)
+    return path
+
+def discard_archive(path):
+    if path:
+        _remove(path)
+
+def archive_reader(path):
+    """Return a callable for st.download_button that reads the archive only when clicked."""
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+# ---------- ENTRY COMPRESSION POLICY ----------
+# fpdf already deflates page streams and embeds the PNG/JPEG data as-is, so
+# deflating whole PDFs again mostly burns CPU. CERT_ARCHIVE_COMPRESSION picks
+# how entries are stored:
+#   "store"           no compression
+#   "deflate[:level]" always deflate (level 1-9, zlib default if omitted)
+#   "auto[:level]"    deflate the first AUTO_SAMPLE_ENTRIES entries, then keep
+#                     deflating only if that saved at least AUTO_MIN_SAVING
+#                     (level 1 if omitted; higher levels gain ~nothing on PDFs)
+
+ARCHIVE_COMPRESSION = os.environ.get("CERT_ARCHIVE_COMPRESSION", "auto")
+AUTO_SAMPLE_ENTRIES = 8
+AUTO_MIN_SAVING = 0.10
+
+class ArchiveCompression:
+    def __init__(self, setting=None):
+        setting = (setting or ARCHIVE_COMPRESSION).strip().lower()
+        mode, _, level = setting.partition(":")
+        if mode not in ("store", "deflate", "auto"):
+            raise ValueError(f"Unknown archive compression: {setting!r}")
+        if level and (mode == "store" or not level.isdigit() or not 1 <= int(level) <= 9):
+            raise ValueError(f"Invalid archive compression level: {setting!r}")
+        self.mode = mode
+        if level:
+            self.level = int(level)
+        else:
+            self.level = 1 if mode == "auto" else None
+        self._sampled = 0
+        self._raw_bytes = 0
+        self._compressed_bytes = 0
+
+    def _compress_type(self):
+        if self.mode == "store":
+            return zipfile.ZIP_STORED
+        if self.mode == "auto" and self._sampled >= AUTO_SAMPLE_ENTRIES:
+            saving = 1 - self._compressed_bytes / max(self._raw_bytes, 1)
+            if saving < AUTO_MIN_SAVING:
+                return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def writestr(self, zipf, name, data):
+        compress_type = self._compress_type()
+        zipf.writestr(name, data, compress_type=compress_type, compresslevel=self.level)
+        if self.mode == "auto" and self._sampled < AUTO_SAMPLE_ENTRIES:
+            info = zipf.getinfo(name)
+            self._sampled += 1
+            self._raw_bytes += info.file_size
+            self._compressed_bytes += info.compress_size
@@ -0,0 +1,68 @@
+import os
+import threading
+
+# ---------- STATIC ASSET PATHS ----------
+
+ORG_ASSETS = {
+    "DLithe": {
+        "logo": "dlithe_logo.png",
+        "seal": "dlithe_seal.png",
+        "signature": "dlithe_signature.jpg"
+    },
+    "nxtAlign": {
+        "logo": "nxtalign_logo.png",
+        "seal": "nxtalign_seal.png",
+        "signature": "nxtalign_signature.jpg"
+    }
+}
+
+# ---------- PROCESS-WIDE IMAGE CACHE ----------
+# fpdf parses (and for RGBA PNGs, un-interlaces the alpha channel of) every
+# image on every FPDF instance. Parsed images are kept here once per process,
+# keyed by absolute path and mtime, and handed to each new PDF as a copy.
+
+class ImageAsset:
+    def __init__(self, path, mtime_ns, info):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.info = info
+        self.width = info["w"]
+        self.height = info["h"]
+
+    def pdf_info(self):
+        # fpdf mutates the dict it is given (object numbers, drops 'data' on
+        # output), so every document gets its own shallow copy.
+        return dict(self.info)
+
+_image_cache = {}
+_image_cache_lock = threading.Lock()
+
+def _parse_image(path):
+    from fpdf import FPDF  # only the PDF pages need fpdf loaded
+    ext = os.path.splitext(path)[1].lower()
+    parser = FPDF()
+    if ext in (".jpg", ".jpeg"):
+        return FPDF._parsejpg(parser, path)
+    if ext == ".png":
+        return FPDF._parsepng(parser, path)
+    raise ValueError(f"Unsupported image type: {path}")
+
+def load_image(path):
+    abs_path = os.path.abspath(path)
+    mtime_ns = os.stat(abs_path).st_mtime_ns
+    asset = _image_cache.get(abs_path)
+    if asset is not None and asset.mtime_ns == mtime_ns:
+        return asset
+    with _image_cache_lock:
+        asset = _image_cache.get(abs_path)
+        if asset is None or asset.mtime_ns != mtime_ns:
+            asset = ImageAsset(abs_path, mtime_ns, _parse_image(abs_path))
+            _image_cache[abs_path] = asset
+    return asset
+
+def get_org_assets(org):
+    """Load (or reuse) the logo, seal and signature of an org; missing files map to None."""
+    assets = {}
+    for role, path in ORG_ASSETS[org].items():
+        assets[role] = load_image(path) if path and os.path.exists(path) else None
+    return assets
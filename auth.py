@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import db
+
+# ---------- PASSWORD HASHING AND SESSION TOKENS ----------
+# Passwords are stored as salted scrypt hashes ("scrypt$n$r$p$salt$key"),
+# with the cost tunable through CERT_AUTH_SCRYPT_N/R/P. Hashing runs on a
+# small thread pool (scrypt releases the GIL), so a burst of logins queues
+# there instead of stalling every other session's script thread. Accounts
+# still holding an unsalted SHA-256 hex digest, or a hash made with other
+# cost settings, are rehashed on their next successful login.
+#
+# A successful login yields a session token: the username, user id, the
+# user's session epoch and an expiry, signed with HMAC-SHA256 under
+# CERT_SESSION_SECRET. Checking one needs no database access. Logging out
+# bumps the user's epoch, which revokes every token issued before it.
+# Epochs live in this process only: after a restart, or in another process,
+# tokens that had been revoked validate again until they expire, which is
+# why the TTL is short (CERT_SESSION_TTL_SECONDS, 30 minutes; the app renews
+# the token of an active session). Without CERT_SESSION_SECRET a random
+# secret is made per process, so tokens stop working when the app restarts.
+
+SCRYPT_N = int(os.environ.get("CERT_AUTH_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("CERT_AUTH_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("CERT_AUTH_SCRYPT_P", "1"))
+AUTH_WORKERS = int(os.environ.get("CERT_AUTH_WORKERS", "2"))
+SESSION_TTL_SECONDS = int(os.environ.get("CERT_SESSION_TTL_SECONDS", str(30 * 60)))
+SESSION_SECRET = os.environ.get("CERT_SESSION_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="password-hash")
+_session_epochs = {}
+_session_epochs_lock = threading.Lock()
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=32
+    )
+
+def _hash(password):
+    salt = secrets.token_bytes(16)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+def _check(password, stored):
+    """Return (matches, new hash if the stored one should be replaced, else None)."""
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, key = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            matches = hmac.compare_digest(_scrypt(password, _b64decode(salt), n, r, p), _b64decode(key))
+        except ValueError:
+            logger.warning("Malformed password hash")
+            return False, None
+        outdated = (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    else:
+        # Unsalted SHA-256 hex digest from before scrypt.
+        matches = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        outdated = True
+    return matches, (_hash(password) if matches and outdated else None)
+
+@lru_cache(maxsize=1)
+def _unknown_user_hash():
+    return _hash(secrets.token_urlsafe(16))
+
+def hash_password(password):
+    """Salted scrypt hash of password, as stored in users.password_hash."""
+    return _executor.submit(_hash, password).result()
+
+def authenticate(username, password):
+    """Return the user's id if username and password match, else None."""
+    storage = db.get_storage()
+    login = storage.find_login(username)
+    if login is None:
+        # Hash anyway, so unknown usernames take as long as wrong passwords.
+        _executor.submit(_check, password, _unknown_user_hash()).result()
+        return None
+    user_id, stored = login
+    matches, new_hash = _executor.submit(_check, password, stored or "").result()
+    if not matches:
+        return None
+    if new_hash is not None:
+        try:
+            storage.update_password_hash(user_id, new_hash)
+        except Exception as e:
+            logger.warning("Could not upgrade the password hash of user %s: %s", user_id, e)
+    return user_id
+
+def _sign(payload):
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode("ascii"), hashlib.sha256).digest())
+
+def session_epoch(user_id):
+    return _session_epochs.get(user_id, 0)
+
+def revoke_sessions(user_id):
+    """Invalidate every session token issued to user_id so far."""
+    with _session_epochs_lock:
+        _session_epochs[user_id] = session_epoch(user_id) + 1
+
+def issue_session_token(username, user_id, ttl_seconds=SESSION_TTL_SECONDS):
+    claims = {"u": username, "i": user_id, "e": session_epoch(user_id), "exp": int(time.time()) + ttl_seconds}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+def _session_claims(token):
+    payload, _, signature = (token or "").partition(".")
+    try:
+        if not hmac.compare_digest(_sign(payload), signature):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (TypeError, ValueError):
+        return None
+    if (
+        not isinstance(claims, dict) or claims.get("exp", 0) < time.time()
+        or claims.get("e") != session_epoch(claims.get("i"))
+    ):
+        return None
+    return claims
+
+def verify_session_token(token):
+    """Return (username, user_id) from a valid, unexpired, unrevoked session token, else None."""
+    claims = _session_claims(token)
+    return None if claims is None else (claims["u"], claims["i"])
+
+def renew_session_token(token, ttl_seconds=SESSION_TTL_SECONDS):
+    """Return a fresh token for a valid one past half its lifetime, else None."""
+    claims = _session_claims(token)
+    if claims is None or claims["exp"] - time.time() > ttl_seconds / 2:
+        return None
+    return issue_session_token(claims["u"], claims["i"], ttl_seconds)
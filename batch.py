@@ -0,0 +1,215 @@
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from archives import ArchiveCompression
+from rendering import MergedCertificatePDF, get_certificate_template
+from pdf_cache import pdf_cache
+from metrics import NULL_METRICS
+
+# ---------- PARALLEL BATCH RENDERING ----------
+# Certificates are laid out in worker processes, a chunk of rows per task.
+# Workers only send back the compressed page stream; the parent wraps it in
+# the (shared, identical) template document, so the embedded images never
+# cross the process boundary. Workers start with the platform's default
+# method; the app is multi-threaded, so they are not forced to fork. The
+# parent builds each template once and hands it to the workers through the
+# pool initializer (a template is plain bytes, strings and dicts), so a
+# worker neither rebuilds templates nor decodes images. Only a variant the
+# pool did not start with is built in the worker. One RenderPool can serve
+# several calls, e.g. all the CSV chunks of an upload, so workers and their
+# templates are reused.
+
+RENDER_WORKERS = int(os.environ.get("CERT_RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_CHUNK_SIZE = int(os.environ.get("CERT_RENDER_CHUNK_SIZE", "50"))
+
+FIELD_ARGS = ("prefix", "name", "usn", "college", "start_date_str", "end_date_str", "topic", "cert_id")
+TEMPLATE_ARGS = ("org", "cert_type", "activity_type", "duration", "logo_path", "signature_path", "seal_path")
+
+# Templates handed to this process by RenderPool, when it is a worker.
+_worker_templates = {}
+
+def _variant(job):
+    return tuple(job.get(arg) for arg in TEMPLATE_ARGS)
+
+def _template_for(job):
+    template = _worker_templates.get(_variant(job))
+    if template is not None:
+        return template
+    return get_certificate_template(
+        job["org"], job.get("cert_type"), job.get("activity_type", "Internship"),
+        job.get("duration", "15 Weeks"), logo_path=job.get("logo_path"),
+        signature_path=job.get("signature_path"), seal_path=job.get("seal_path")
+    )
+
+def _install_templates(templates):
+    _worker_templates.update(templates)
+
+class RenderPool:
+    """Rendering worker processes shared by several render_certificate_pages calls."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or RENDER_WORKERS
+        self._executor = None
+
+    def executor(self, jobs):
+        """The process pool, started on first use with the templates of `jobs` sent to every worker."""
+        if self._executor is None:
+            templates = {}
+            for job in jobs:
+                variant = _variant(job)
+                if variant not in templates:
+                    try:
+                        templates[variant] = _template_for(job)
+                    except Exception:
+                        pass  # reported per row by _render_chunk
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_install_templates, initargs=(templates,)
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _render_chunk(jobs):
+    results = []
+    for job in jobs:
+        try:
+            content = _template_for(job).render_content(*[job[field] for field in FIELD_ARGS])
+            results.append((content, None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+def render_certificate_pages(jobs, workers=None, chunk_size=None, cache=pdf_cache, metrics=NULL_METRICS, pool=None):
+    """Lay out certificates for a list of generate_certificate_pdf keyword dicts.
+
+    Yields (template, content, asset_errors, error) per job, in the order of
+    `jobs`, where content is the page stream from template.render_content;
+    `error` is the message of the exception raised while rendering that row.
+    Rows found in `cache` are not rendered again; new renders are added to it.
+    Time spent on templates and cache lookups and on layout is added to the
+    "template" and "render" stages of `metrics`. Chunks go to `pool` (a
+    RenderPool) if given, else to a pool of `workers` made for this call.
+    """
+    workers = workers or RENDER_WORKERS
+    chunk_size = chunk_size or RENDER_CHUNK_SIZE
+    use_cache = cache is not None and cache.enabled
+
+    # Build templates (and decode their images) here, once, before any
+    # worker starts: the pool sends them to its workers.
+    keys = []
+    contents = []
+    with metrics.stage("template"):
+        for job in jobs:
+            key = content = None
+            try:
+                template = _template_for(job)
+                if use_cache:
+                    key = cache.key(template, [job[field] for field in FIELD_ARGS])
+                    content = cache.get(key)
+            except Exception:
+                pass  # reported per row by the worker
+            keys.append(key)
+            contents.append(content)
+
+    pending = [job for job, content in zip(jobs, contents) if content is None]
+    metrics.count("pdf_cache_hits", len(jobs) - len(pending))
+    metrics.count("rendered", len(pending))
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    own_pool = None
+    if pool is None and workers > 1 and len(chunks) > 1:
+        pool = own_pool = RenderPool(min(workers, len(chunks)))
+    if pool is not None and pool.workers > 1 and len(chunks) > 1:
+        chunk_results = pool.executor(pending).map(_render_chunk, chunks)
+    else:
+        chunk_results = map(_render_chunk, chunks)
+    rendered = (result for results in chunk_results for result in results)
+    try:
+        for job, key, content in zip(jobs, keys, contents):
+            if content is None:
+                with metrics.stage("render"):
+                    content, error = next(rendered)
+                if error is not None:
+                    yield None, None, [], error
+                    continue
+                if key is not None:
+                    cache.put(key, content)
+            template = _template_for(job)
+            yield template, content, template.asset_errors, None
+    finally:
+        if own_pool is not None:
+            own_pool.close()
+
+def render_certificates(jobs, workers=None, chunk_size=None, cache=pdf_cache, metrics=NULL_METRICS):
+    """render_certificate_pages, yielding (pdf_bytes, asset_errors, error) with one PDF per job.
+
+    PDF assembly is added to the "assemble" stage of `metrics`.
+    """
+    pages = render_certificate_pages(jobs, workers=workers, chunk_size=chunk_size, cache=cache, metrics=metrics)
+    for template, content, asset_errors, error in pages:
+        if error is not None:
+            yield None, [], error
+            continue
+        with metrics.stage("assemble"):
+            pdf_bytes = template.assemble(content)
+        yield pdf_bytes, asset_errors, None
+
+# ---------- BATCH OUTPUT ----------
+# A batch is written either as a ZIP with one PDF per certificate or, for
+# printing, as a single merged multi-page PDF. Both writers take the pages
+# yielded by render_certificate_pages and are picked by OUTPUT_FORMATS key.
+
+class _CertificateWriter:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ZipCertificateWriter(_CertificateWriter):
+    extension = ".zip"
+    mime = "application/zip"
+
+    def __init__(self, path, metrics=NULL_METRICS):
+        self.metrics = metrics
+        self.compression = ArchiveCompression()
+        self.zipf = zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, file_name, template, content):
+        with self.metrics.stage("assemble"):
+            pdf_bytes = template.assemble(content)
+        with self.metrics.stage("zip"):
+            self.compression.writestr(self.zipf, file_name, pdf_bytes)
+
+    def close(self):
+        self.zipf.close()
+
+class MergedPDFWriter(_CertificateWriter):
+    extension = ".pdf"
+    mime = "application/pdf"
+
+    def __init__(self, path, metrics=NULL_METRICS):
+        self.metrics = metrics
+        self.file = open(path, "wb")
+        self.pdf = MergedCertificatePDF(self.file)
+
+    def add(self, file_name, template, content):
+        with self.metrics.stage("merge"):
+            self.pdf.add_page(template, content)
+
+    def close(self):
+        try:
+            with self.metrics.stage("merge"):
+                self.pdf.close()
+        finally:
+            self.file.close()
+
+OUTPUT_FORMATS = {"zip": ZipCertificateWriter, "pdf": MergedPDFWriter}
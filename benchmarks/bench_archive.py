@@ -0,0 +1,64 @@
+"""Time and size of certificate ZIPs under each archive compression policy.
+
+Renders a synthetic batch once, then writes it to a ZIP per policy:
+
+    python benchmarks/bench_archive.py --rows 1000 --org DLithe
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from assets import ORG_ASSETS
+from archives import ArchiveCompression
+from batch import render_certificates
+
+POLICIES = ["store", "deflate:1", "deflate:6", "deflate:9", "auto"]
+
+def synthetic_jobs(rows, org):
+    assets = ORG_ASSETS[org]
+    return [
+        dict(
+            prefix="Mr" if i % 2 else "Ms", name=f"Student {i:05d}", usn=f"4XX21CS{i:03d}",
+            college="Example Institute of Technology, Mangaluru",
+            start_date_str="1st June 2025", end_date_str="15th September 2025",
+            topic=f"Project topic number {i}", cert_id=f"DLPY4XX21CS{i:03d}SEP25", org=org,
+            logo_path=assets["logo"], signature_path=assets["signature"], seal_path=assets["seal"],
+            cert_type="Final"
+        )
+        for i in range(rows)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--org", choices=list(ORG_ASSETS), default="DLithe")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    pdfs = [pdf for pdf, _, error in render_certificates(synthetic_jobs(args.rows, args.org)) if error is None]
+    render_seconds = time.perf_counter() - started
+    raw_bytes = sum(len(pdf) for pdf in pdfs)
+    print(f"rendered {len(pdfs)} PDFs ({raw_bytes / 1e6:.1f} MB) in {render_seconds:.2f}s")
+    print(f"{'policy':<12}{'seconds':>10}{'MB':>10}{'ratio':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for policy in POLICIES:
+            path = os.path.join(tmp, f"{policy.replace(':', '_')}.zip")
+            compression = ArchiveCompression(policy)
+            started = time.perf_counter()
+            with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_DEFLATED) as zipf:
+                for i, pdf in enumerate(pdfs):
+                    compression.writestr(zipf, f"certificate_{i:05d}.pdf", pdf)
+            seconds = time.perf_counter() - started
+            size = os.path.getsize(path)
+            print(f"{policy:<12}{seconds:>10.2f}{size / 1e6:>10.1f}{size / raw_bytes:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Login burst throughput and latency, and what it costs other sessions.
+
+Creates users in a throwaway SQLite database, then logs them in from many
+threads at once (as a cohort does at the start of a submission window)
+while a heartbeat thread, standing in for other sessions' script threads,
+measures how long it is kept waiting. Also times session-token checks:
+
+    python benchmarks/bench_auth.py --users 50 --logins 400 --concurrency 16
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+WORKDIR = tempfile.mkdtemp()
+os.environ["CERT_STORAGE"] = "sqlite"
+os.environ["CERT_SQLITE_PATH"] = os.path.join(WORKDIR, "bench_auth.db")
+
+import auth
+import db
+
+def heartbeat(stop, stalls, interval=0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    storage = db.get_storage()
+    started = time.perf_counter()
+    for i in range(args.users):
+        storage.create_user(f"user{i}", f"user{i}@example.com", auth.hash_password(f"password{i}"))
+    hash_ms = (time.perf_counter() - started) / args.users * 1000
+
+    def login(i):
+        started = time.perf_counter()
+        ok = auth.authenticate(f"user{i % args.users}", f"password{i % args.users}") is not None
+        return ok, time.perf_counter() - started
+
+    stop = threading.Event()
+    stalls = []
+    ticker = threading.Thread(target=heartbeat, args=(stop, stalls))
+    ticker.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, range(args.logins)))
+    burst_seconds = time.perf_counter() - started
+    stop.set()
+    ticker.join()
+
+    latencies = sorted(seconds for _, seconds in results)
+    failed = sum(not ok for ok, _ in results)
+    token = auth.issue_session_token("user0", 1)
+    started = time.perf_counter()
+    for _ in range(10000):
+        auth.verify_session_token(token)
+    verify_us = (time.perf_counter() - started) / 10000 * 1e6
+
+    print(f"scrypt n={auth.SCRYPT_N} r={auth.SCRYPT_R} p={auth.SCRYPT_P}, "
+          f"{auth.AUTH_WORKERS} hashing threads: {hash_ms:.1f} ms per hash")
+    print(f"{args.logins} logins from {args.concurrency} threads: {burst_seconds:.2f} s "
+          f"({args.logins / burst_seconds:.0f} logins/s), {failed} failed")
+    print(f"  login latency p50 {statistics.median(latencies) * 1000:.0f} ms, "
+          f"p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:.0f} ms")
+    print(f"  heartbeat stall p99 {sorted(stalls)[int(0.99 * (len(stalls) - 1))] * 1000:.1f} ms, "
+          f"max {max(stalls) * 1000:.1f} ms")
+    print(f"session token check: {verify_us:.1f} us, no database access")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    try:
+        status = main()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    sys.exit(status)
@@ -0,0 +1,229 @@
+"""Per-stage timings of the certificate pipeline on synthetic intern CSVs.
+
+Each run generates a CSV of the given size and times every stage on its
+own: CSV parsing, column cleaning, certificate IDs, date formatting,
+per-certificate rendering, batch rendering, ZIP assembly, the merged
+single-PDF output and the database insert (into a throwaway SQLite file). Results are printed and, with
+--output, written as JSON for comparing versions:
+
+    python benchmarks/bench_pipeline.py --rows 100 1000 10000 --output bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# Measure rendering, not the rendered-certificate cache (--pdf-cache turns it on).
+if "--pdf-cache" not in sys.argv:
+    os.environ["CERT_PDF_CACHE_MAX_BYTES"] = "0"
+
+import pandas as pd
+import db
+from pipeline import (
+    DOMAIN_SHORTFORMS, INSERT_CHUNK_SIZE, certificate_insert_params, format_date,
+    generate_certificate_ids, generate_certificate_pdf, map_and_clean_columns
+)
+from archives import ArchiveCompression
+from assets import ORG_ASSETS
+from batch import MergedPDFWriter, render_certificate_pages, render_certificates
+
+STAGES = ["read_csv", "clean", "certificate_id", "format_date", "render", "render_batch", "zip", "merged_pdf", "db_insert"]
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d %B %Y"]
+
+def synthetic_csv(rows, seed=0):
+    rnd = random.Random(seed)
+    out = io.StringIO()
+    out.write("Prefix,Name,USN,College,Email,Phone,Start Date,End Date,Program,Mode,Topic\n")
+    for i in range(rows):
+        start = pd.Timestamp("2025-01-06") + pd.Timedelta(days=rnd.randrange(180))
+        end = start + pd.Timedelta(weeks=rnd.choice([4, 8, 15]))
+        fmt = rnd.choice(DATE_FORMATS)
+        out.write(
+            f"{rnd.choice(['Mr', 'Ms'])},Student {i:06d},4XX{21 + i % 4}CS{i:06d},"
+            f"\"Example Institute of Technology {i % 40}, Mangaluru\",student{i}@example.com,9{i:09d},"
+            f"{start:{fmt}},{end:{fmt}},Summer Internship,{rnd.choice(['Online', 'Offline'])},"
+            f"Project topic number {i % 500}\n"
+        )
+    return out.getvalue().encode()
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+class StageTimer:
+    def __init__(self, rows):
+        self.rows = rows
+        self.results = {}
+
+    def record(self, name, seconds, latencies=None, output_path=None):
+        result = {
+            "seconds": round(seconds, 6),
+            "rows_per_sec": round(self.rows / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        if output_path:
+            result["output_mb"] = round(os.path.getsize(output_path) / (1024 * 1024), 2)
+        if latencies:
+            latencies.sort()
+            result["p50_ms"] = round(percentile(latencies, 0.50) * 1000, 4)
+            result["p99_ms"] = round(percentile(latencies, 0.99) * 1000, 4)
+        self.results[name] = result
+
+    def timed(self, name, fn):
+        started = time.perf_counter()
+        value = fn()
+        self.record(name, time.perf_counter() - started)
+        return value
+
+    def per_row(self, name, items, fn):
+        values = []
+        latencies = []
+        clock = time.perf_counter
+        started = clock()
+        for item in items:
+            row_started = clock()
+            values.append(fn(item))
+            latencies.append(clock() - row_started)
+        self.record(name, clock() - started, latencies)
+        return values
+
+def run(rows, org, domain, stages, workdir):
+    timer = StageTimer(rows)
+    assets = ORG_ASSETS[org]
+    data = synthetic_csv(rows)
+
+    raw_df = timer.timed("read_csv", lambda: pd.read_csv(io.BytesIO(data)))
+    df = timer.timed("clean", lambda: map_and_clean_columns(raw_df))
+    df["Domain"] = domain
+    records = df.to_dict("records")
+
+    cert_ids = timer.timed(
+        "certificate_id", lambda: generate_certificate_ids(df, DOMAIN_SHORTFORMS[domain], org).tolist()
+    )
+    for row, cert_id in zip(records, cert_ids):
+        row["Certificate ID"] = cert_id
+
+    format_date.cache_clear()
+    dates = timer.per_row(
+        "format_date", records, lambda row: (format_date(row["Start Date"]), format_date(row["End Date"]))
+    )
+    jobs = [
+        dict(
+            prefix=row["Prefix"], name=row["Name"], usn=row["USN"], college=row["College"],
+            start_date_str=start, end_date_str=end, topic=row["Topic"], cert_id=row["Certificate ID"],
+            org=org, logo_path=assets["logo"], signature_path=assets["signature"], seal_path=assets["seal"],
+            cert_type="Final"
+        )
+        for row, (start, end) in zip(records, dates)
+    ]
+
+    if "render" in stages:
+        timer.per_row("render", jobs, lambda job: len(generate_certificate_pdf(**job)))
+
+    if "render_batch" in stages or "zip" in stages:
+        # Renders are written to the ZIP as they arrive, as in the app, so
+        # the batch is never held in memory; the two stages are clocked apart.
+        compression = ArchiveCompression()
+        zip_seconds = 0.0
+        clock = time.perf_counter
+        started = clock()
+        zip_path = os.path.join(workdir, f"bench_{rows}.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            for job, (pdf, _, error) in zip(jobs, render_certificates(jobs)):
+                if error is not None or "zip" not in stages:
+                    continue
+                write_started = clock()
+                compression.writestr(zipf, f"{job['name'].replace(' ', '_')}_{job['cert_id']}.pdf", pdf)
+                zip_seconds += clock() - write_started
+        total = clock() - started
+        if "render_batch" in stages:
+            timer.record("render_batch", total - zip_seconds)
+        if "zip" in stages:
+            timer.record("zip", zip_seconds, output_path=zip_path)
+
+    if "merged_pdf" in stages:
+        # Rendering and writing the whole batch as one merged PDF, end to end.
+        pdf_path = os.path.join(workdir, f"bench_{rows}.pdf")
+        def merge():
+            with MergedPDFWriter(pdf_path) as writer:
+                for job, (template, content, _, error) in zip(jobs, render_certificate_pages(jobs)):
+                    if error is None:
+                        writer.add(None, template, content)
+        started = time.perf_counter()
+        merge()
+        timer.record("merged_pdf", time.perf_counter() - started, output_path=pdf_path)
+
+    if "db_insert" in stages:
+        storage = db.SQLiteStorage(os.path.join(workdir, f"bench_{rows}.db"))
+        params = [certificate_insert_params(1, row) for row in records]
+        rejected = timer.timed("db_insert", lambda: storage.insert_certificates(org, params, INSERT_CHUNK_SIZE))
+        if rejected:
+            print(f"  {len(rejected)} rows rejected by the database", file=sys.stderr)
+        storage.engine.dispose()
+
+    return {"rows": rows, "stages": {name: timer.results[name] for name in STAGES if name in timer.results}}
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--org", choices=list(ORG_ASSETS), default="DLithe")
+    parser.add_argument("--domain", choices=list(DOMAIN_SHORTFORMS), default="Python Fullstack")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="optional stages to run (parsing, cleaning, IDs and dates always run)")
+    parser.add_argument("--pdf-cache", action="store_true", help="leave the rendered-certificate cache on")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "org": args.org,
+        "pdf_cache": args.pdf_cache,
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            result = run(rows, args.org, args.domain, set(args.stages), workdir)
+            report["runs"].append(result)
+            print(f"{rows} rows")
+            print(f"  {'stage':<16}{'seconds':>10}{'rows/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>9}{'out MB':>9}")
+            for name, stage in result["stages"].items():
+                p50 = f"{stage['p50_ms']:.3f}" if "p50_ms" in stage else "-"
+                p99 = f"{stage['p99_ms']:.3f}" if "p99_ms" in stage else "-"
+                print(f"  {name:<16}{stage['seconds']:>10.3f}{stage['rows_per_sec'] or 0:>12.0f}"
+                      f"{p50:>10}{p99:>10}{stage['peak_rss_mb']:>9.1f}{stage.get('output_mb', '-'):>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Cold-start import time of the app against a budget.
+
+Each measurement runs in a fresh interpreter: `import app` under
+-X importtime (reporting the slowest top-level imports), then a first render
+of the login page. Fails if the import exceeds --budget-ms or if the login
+page pulled in pandas or the PDF stack:
+
+    python benchmarks/bench_startup.py --repeat 5 --budget-ms 1500 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the login and register pages must not load.
+HEAVY_MODULES = ["pandas", "numpy", "fpdf", "PIL", "pipeline", "batch", "rendering"]
+
+FIRST_PAGE = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "exceptions": [str(e.value) for e in at.exception],
+    "heavy_loaded": [m for m in %r if m in sys.modules],
+}))
+""" % HEAVY_MODULES
+
+def measure_import():
+    """Return (total ms for `import app`, {module: ms} for the modules app imports directly)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    children = {}
+    for line in result.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        ms = int(fields[1]) / 1000
+        # -X importtime prints a module after everything it imported.
+        if depth == 1:
+            children[name.strip()] = ms
+        elif depth == 0:
+            if name.strip() == "app":
+                return ms, children
+            children = {}
+    raise RuntimeError("app was not imported")
+
+def measure_first_page():
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_PAGE], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.repeat)]
+    totals = [total for total, _ in imports]
+    first_pages = [measure_first_page() for _ in range(args.repeat)]
+
+    slowest = sorted(imports[-1][1].items(), key=lambda item: -item[1])
+    heavy_loaded = sorted({m for page in first_pages for m in page["heavy_loaded"]})
+    report = {
+        "import_app_ms": {"median": statistics.median(totals), "min": min(totals), "max": max(totals)},
+        "budget_ms": args.budget_ms,
+        "slowest_imports_ms": dict(slowest[:args.top]),
+        "login_page_seconds": statistics.median(page["seconds"] for page in first_pages),
+        "login_page_heavy_modules": heavy_loaded,
+        "login_page_exceptions": first_pages[-1]["exceptions"],
+    }
+
+    print(f"import app: median {report['import_app_ms']['median']:.0f} ms "
+          f"(budget {args.budget_ms:.0f} ms, min {min(totals):.0f}, max {max(totals):.0f})")
+    for name, ms in report["slowest_imports_ms"].items():
+        print(f"  {name:<40}{ms:>8.1f} ms")
+    print(f"login page first render: {report['login_page_seconds']:.2f} s")
+    print(f"heavy modules loaded by the login page: {', '.join(heavy_loaded) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = report["import_app_ms"]["median"] > args.budget_ms or heavy_loaded or report["login_page_exceptions"]
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
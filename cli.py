@@ -0,0 +1,88 @@
+"""Generate a batch of certificates from a CSV without the Streamlit app.
+
+Runs the same cleaning, rendering and ingestion as "Upload & Generate
+Certificates": writes the ZIP (or, with --format pdf, one merged PDF) and
+inserts the rows (status pending_review) for the given user. Rows already
+uploaded unchanged are skipped, and changed ones are updated in place and go
+back to pending_review. Suitable for cron:
+
+    python cli.py students.csv --org DLithe --domain "Python Fullstack" \\
+        --user alice --cert-type Final --output certificates.zip
+
+Exits with status 1 if any row could not be generated.
+"""
+import argparse
+import os
+import sys
+import time
+import db
+from assets import ORG_ASSETS
+from metrics import new_batch
+from pipeline import CSV_CHUNK_ROWS, DOMAIN_SHORTFORMS, archive_file_name, generate_certificates_from_csv
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv", help="student data CSV")
+    parser.add_argument("--org", required=True, choices=list(ORG_ASSETS))
+    parser.add_argument("--domain", required=True, choices=list(DOMAIN_SHORTFORMS))
+    parser.add_argument("--user", required=True, help="username the certificates are issued under")
+    parser.add_argument("--cert-type", choices=["Provisional", "Final"], default="Provisional")
+    parser.add_argument("--activity-type", default="Internship")
+    parser.add_argument("--duration", default="15 Weeks")
+    parser.add_argument("--format", choices=["zip", "pdf"], default="zip",
+                        help="a ZIP of one PDF per certificate, or one merged PDF for printing")
+    parser.add_argument("--output", help="file to write (default: <org>_<program>_<timestamp>.zip or .pdf)")
+    parser.add_argument("--workers", type=int, help="rendering processes (default: CERT_RENDER_WORKERS)")
+    parser.add_argument("--chunk-rows", type=int, default=CSV_CHUNK_ROWS, help="CSV rows read per chunk")
+    parser.add_argument("--include-unchanged", action="store_true",
+                        help="also put certificates for rows already uploaded unchanged in the ZIP")
+    parser.add_argument("--quiet", action="store_true", help="only report errors")
+    args = parser.parse_args(argv)
+
+    user_id = db.get_storage().find_user_id(args.user)
+    if user_id is None:
+        parser.error(f"unknown user: {args.user}")
+
+    errors = 0
+    processed = 0
+    started = time.perf_counter()
+    metrics = new_batch("cli", label=os.path.basename(args.csv))
+
+    def report_error(message):
+        nonlocal errors
+        errors += 1
+        metrics.count("errors")
+        print(message, file=sys.stderr)
+
+    def on_chunk(rows):
+        nonlocal processed
+        processed += rows
+        if not args.quiet:
+            rate = processed / max(time.perf_counter() - started, 1e-9)
+            print(f"{processed} rows processed ({rate:.0f} rows/s)", file=sys.stderr)
+
+    zip_path = (args.output or "certificates." + args.format) + ".partial"
+    try:
+        summary = generate_certificates_from_csv(
+            args.csv, zip_path, user_id, args.org, args.domain, args.cert_type, args.activity_type,
+            args.duration, report_error=report_error, metrics=metrics, workers=args.workers,
+            chunk_rows=args.chunk_rows, on_chunk=on_chunk, include_unchanged=args.include_unchanged,
+            output_format=args.format
+        )
+    except BaseException:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
+    finally:
+        metrics.finish()
+    output = args.output or archive_file_name(args.org, summary["program_name"], "." + args.format)
+    os.replace(zip_path, output)
+
+    if not args.quiet:
+        print(f"Wrote {output}: {processed} rows ({summary['inserted']} new, {summary['updated']} updated, "
+              f"{summary['unchanged']} unchanged), {errors} errors, "
+              f"{time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
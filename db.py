@@ -0,0 +1,469 @@
+import logging
+import os
+import threading
+import tomllib
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import URL, bindparam, create_engine, event, inspect, text
+
+# ---------- DATABASE ACCESS ----------
+# Users and certificate_data_{org} live behind a storage backend picked by
+# CERT_STORAGE:
+#   "mysql"   the shared MySQL server, configured like st.connection("mysql"):
+#             the [connections.mysql] section of .streamlit/secrets.toml
+#             (project, then home directory), or CERT_DB_URL
+#   "sqlite"  an embedded database file (CERT_SQLITE_PATH, certificates.db
+#             next to the app) with the schema created on first use
+# Each backend owns one process-wide SQLAlchemy engine with an explicitly
+# sized connection pool, shared by the Streamlit pages and the background
+# jobs. The fixed statements are built once and reused, so SQLAlchemy
+# compiles each of them only once per engine.
+
+STORAGE_BACKEND = os.environ.get("CERT_STORAGE", "mysql")
+DB_CONNECTION = "mysql"
+DB_POOL_SIZE = int(os.environ.get("CERT_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("CERT_DB_MAX_OVERFLOW", "5"))
+DB_POOL_RECYCLE_SECONDS = int(os.environ.get("CERT_DB_POOL_RECYCLE_SECONDS", "3600"))
+SQLITE_PATH = os.environ.get(
+    "CERT_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "certificates.db")
+)
+
+logger = logging.getLogger(__name__)
+
+SECRETS_FILES = [
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+]
+
+def _connection_config():
+    config = {}
+    for path in SECRETS_FILES:
+        try:
+            with open(path, "rb") as f:
+                secrets = tomllib.load(f)
+        except FileNotFoundError:
+            continue
+        config.update(secrets.get("connections", {}).get(DB_CONNECTION, {}))
+    return config
+
+def _database_url(config):
+    if os.environ.get("CERT_DB_URL"):
+        return os.environ["CERT_DB_URL"]
+    if "url" in config:
+        return config["url"]
+    if "dialect" not in config:
+        raise RuntimeError(f"No database configured: set CERT_DB_URL or [connections.{DB_CONNECTION}] in secrets.toml")
+    drivername = config["dialect"] + (f"+{config['driver']}" if "driver" in config else "")
+    return URL.create(
+        drivername=drivername,
+        username=config.get("username"),
+        password=config.get("password"),
+        host=config.get("host"),
+        port=int(config["port"]) if "port" in config else None,
+        database=config.get("database"),
+        query=config.get("query", {}),
+    )
+
+# ---------- STATEMENTS ----------
+
+INSERT_USER = text("INSERT INTO users (username, email, password_hash) VALUES (:username, :email, :password_hash)")
+SELECT_LOGIN = text("SELECT id, password_hash FROM users WHERE username = :username")
+UPDATE_PASSWORD_HASH = text("UPDATE users SET password_hash = :password_hash WHERE id = :id")
+SELECT_USER_ID = text("SELECT id FROM users WHERE username = :username")
+
+CERTIFICATE_COLUMNS = (
+    "user_id", "prefix", "name", "usn", "college", "email", "phone", "registered", "start_date", "end_date",
+    "program", "mode", "payment_status", "certificate_issued_date", "topic", "domain", "certificate_id",
+    "content_hash"
+)
+EXISTENCE_CHECK_CHUNK = 500
+SUFFIX_SCAN_CHUNK = 100
+
+@lru_cache(maxsize=None)
+def certificate_insert_statement(org):
+    return text(f"""
+        INSERT INTO certificate_data_{org} (
+            {", ".join(CERTIFICATE_COLUMNS)}, status
+        ) VALUES (
+            {", ".join(":" + column for column in CERTIFICATE_COLUMNS)}, 'pending_review'
+        )
+    """)
+
+@lru_cache(maxsize=None)
+def certificate_update_statement(org):
+    # A changed certificate goes back to review. Rows from before content
+    # hashes were stored are compared field by field instead: if nothing
+    # changed, the update only backfills content_hash. status is assigned
+    # first because MySQL evaluates SET left to right.
+    assignments = ", ".join(
+        f"{column} = :{column}" for column in CERTIFICATE_COLUMNS if column not in ("user_id", "certificate_id")
+    )
+    unchanged = " AND ".join(
+        f"({column} = :{column} OR ({column} IS NULL AND :{column} IS NULL))"
+        for column in CERTIFICATE_COLUMNS if column not in ("user_id", "certificate_id", "content_hash")
+    )
+    return text(f"""
+        UPDATE certificate_data_{org}
+        SET status = CASE WHEN content_hash IS NULL AND {unchanged} THEN status ELSE 'pending_review' END,
+            {assignments}
+        WHERE certificate_id = :certificate_id AND user_id = :user_id
+    """)
+
+@lru_cache(maxsize=None)
+def existing_certificates_query(org):
+    return text(
+        f"SELECT certificate_id, user_id, content_hash, usn, name FROM certificate_data_{org} "
+        "WHERE certificate_id IN :certificate_ids"
+    ).bindparams(bindparam("certificate_ids", expanding=True))
+
+@lru_cache(maxsize=None)
+def suffixed_certificates_query(org, count):
+    # Base IDs and their "-N" suffixed variants; "!" escapes LIKE wildcards
+    # in the bases.
+    conditions = " OR ".join(
+        f"certificate_id = :base_{n} OR certificate_id LIKE :suffixed_{n} ESCAPE '!'" for n in range(count)
+    )
+    return text(f"SELECT certificate_id, user_id, content_hash, usn, name FROM certificate_data_{org} WHERE {conditions}")
+
+def _like_prefix(value):
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+@lru_cache(maxsize=None)
+def approved_certificates_query(org, new_only):
+    query = f"""
+        SELECT c.prefix, c.name, c.usn, c.college, c.topic, c.certificate_id, c.start_date, c.end_date
+        FROM certificate_data_{org} c
+        WHERE c.user_id = :user_id AND c.status = 'Review_Completed'
+    """
+    if new_only:
+        query += """
+          AND NOT EXISTS (
+              SELECT 1 FROM certificate_exports e
+              WHERE e.user_id = c.user_id AND e.org = :org AND e.certificate_id = c.certificate_id
+          )
+        """
+    return text(query)
+
+@lru_cache(maxsize=None)
+def certificate_lookup_query(org):
+    return text(f"""
+        SELECT name, usn, college, program, domain, topic, start_date, end_date, status
+        FROM certificate_data_{org}
+        WHERE certificate_id = :certificate_id
+        LIMIT 1
+    """)
+
+# certificate_exports records which approved certificates each user has
+# downloaded, so the approved page can export only the new ones.
+CREATE_EXPORT_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS certificate_exports (
+        user_id INT NOT NULL,
+        org VARCHAR(32) NOT NULL,
+        certificate_id VARCHAR(128) NOT NULL,
+        exported_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, org, certificate_id)
+    )
+""")
+DELETE_EXPORT = text("DELETE FROM certificate_exports WHERE user_id = :user_id AND org = :org AND certificate_id = :certificate_id")
+INSERT_EXPORT = text("INSERT INTO certificate_exports (user_id, org, certificate_id, exported_at) VALUES (:user_id, :org, :certificate_id, :exported_at)")
+
+@lru_cache(maxsize=None)
+def export_reset_statement(org):
+    # Forget the export of a certificate that went back to review.
+    return text(f"""
+        DELETE FROM certificate_exports
+        WHERE user_id = :user_id AND org = :org AND certificate_id = :certificate_id
+          AND EXISTS (
+              SELECT 1 FROM certificate_data_{org} c
+              WHERE c.certificate_id = :certificate_id AND c.user_id = :user_id AND c.status = 'pending_review'
+          )
+    """)
+
+# ---------- STORAGE BACKENDS ----------
+
+class SQLStorage:
+    """Users and certificate data over a SQLAlchemy engine; subclasses supply the engine and schema."""
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()
+        self._ready_tables = set()
+
+    def _create_engine(self):
+        raise NotImplementedError
+
+    def _create_table(self, conn, table):
+        """Create `table` ("users", "certificate_exports" or "certificate_data_{org}") if the backend manages it."""
+        if table == "certificate_exports":
+            conn.execute(CREATE_EXPORT_TABLE)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def _ensure_table(self, table):
+        if table not in self._ready_tables:
+            with self.engine.begin() as conn:
+                self._create_table(conn, table)
+            self._ready_tables.add(table)
+
+    def _migrate_certificate_table(self, conn, table):
+        columns = {column["name"] for column in inspect(conn).get_columns(table)}
+        if "content_hash" not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN content_hash CHAR(64)")
+        self._ensure_unique_certificate_index(conn, table)
+
+    def _ensure_unique_certificate_index(self, conn, table):
+        # Verification looks certificates up by ID, and an ID identifies one
+        # certificate. Existing duplicates keep the unique index from being
+        # created; the plain index stays (or is added) then, so lookups are
+        # still indexed, just without the guarantee. It is only dropped once
+        # the unique one exists.
+        indexes = inspect(conn).get_indexes(table)
+        if any(index["unique"] and index["column_names"] == ["certificate_id"] for index in indexes):
+            return
+        plain = f"{table}_certificate_id"
+        try:
+            conn.exec_driver_sql(f"CREATE UNIQUE INDEX {plain}_unique ON {table} (certificate_id)")
+        except Exception as e:
+            logger.warning("Could not add a unique certificate_id index to %s: %s", table, e)
+            if not any(index["column_names"][:1] == ["certificate_id"] for index in indexes):
+                conn.exec_driver_sql(f"CREATE INDEX {plain} ON {table} (certificate_id)")
+            return
+        if any(index["name"] == plain for index in indexes):
+            conn.exec_driver_sql(f"DROP INDEX {plain} ON {table}" if conn.dialect.name == "mysql" else f"DROP INDEX {plain}")
+
+    def create_user(self, username, email, password_hash):
+        self._ensure_table("users")
+        with self.engine.begin() as conn:
+            conn.execute(INSERT_USER, {"username": username, "email": email, "password_hash": password_hash})
+
+    def find_login(self, username):
+        """Return (id, password_hash) for username, or None if there is no such user."""
+        self._ensure_table("users")
+        with self.engine.connect() as conn:
+            row = conn.execute(SELECT_LOGIN, {"username": username}).first()
+        return (int(row.id), row.password_hash) if row is not None else None
+
+    def update_password_hash(self, user_id, password_hash):
+        self._ensure_table("users")
+        with self.engine.begin() as conn:
+            conn.execute(UPDATE_PASSWORD_HASH, {"id": user_id, "password_hash": password_hash})
+
+    def find_user_id(self, username):
+        self._ensure_table("users")
+        with self.engine.connect() as conn:
+            user_id = conn.execute(SELECT_USER_ID, {"username": username}).scalar()
+        return int(user_id) if user_id is not None else None
+
+    def insert_certificates(self, org, params, chunk_size):
+        """Insert certificate rows, one executemany and commit per chunk.
+
+        A chunk that fails is retried row by row (each under a savepoint) so the
+        good rows still go in. Returns the rejected rows as (index, error) pairs.
+        """
+        self._ensure_table(f"certificate_data_{org}")
+        statement = certificate_insert_statement(org)
+        rejected = []
+        with self.engine.connect() as conn:
+            for start in range(0, len(params), chunk_size):
+                chunk = params[start:start + chunk_size]
+                try:
+                    conn.execute(statement, chunk)
+                    conn.commit()
+                    continue
+                except Exception:
+                    conn.rollback()
+                for index, row_params in enumerate(chunk, start):
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(statement, row_params)
+                    except Exception as e:
+                        rejected.append((index, str(e)))
+                conn.commit()
+        return rejected
+
+    def existing_certificates(self, org, certificate_ids):
+        """Map each of certificate_ids already in the org's table to its user_id, content_hash, usn and name."""
+        self._ensure_table(f"certificate_data_{org}")
+        certificate_ids = list(certificate_ids)
+        found = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(certificate_ids), EXISTENCE_CHECK_CHUNK):
+                chunk = certificate_ids[start:start + EXISTENCE_CHECK_CHUNK]
+                for row in conn.execute(existing_certificates_query(org), {"certificate_ids": chunk}).mappings():
+                    found[row.certificate_id] = dict(row)
+        return found
+
+    def suffixed_certificates(self, org, base_ids):
+        """Like existing_certificates, for every stored ID that is one of base_ids or one of them plus "-<suffix>"."""
+        self._ensure_table(f"certificate_data_{org}")
+        base_ids = list(base_ids)
+        found = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(base_ids), SUFFIX_SCAN_CHUNK):
+                chunk = base_ids[start:start + SUFFIX_SCAN_CHUNK]
+                params = {}
+                for n, base_id in enumerate(chunk):
+                    params[f"base_{n}"] = base_id
+                    params[f"suffixed_{n}"] = _like_prefix(base_id) + "-%"
+                for row in conn.execute(suffixed_certificates_query(org, len(chunk)), params).mappings():
+                    found[row.certificate_id] = dict(row)
+        return found
+
+    def update_certificates(self, org, params):
+        """Overwrite existing rows (matched on certificate_id and user_id) with new content.
+
+        The export marks of rows sent back to review are cleared in the same
+        transaction, so a changed certificate is exported again as a new
+        approval once re-approved.
+        """
+        if not params:
+            return
+        self._ensure_table(f"certificate_data_{org}")
+        self._ensure_table("certificate_exports")
+        with self.engine.begin() as conn:
+            conn.execute(certificate_update_statement(org), params)
+            conn.execute(export_reset_statement(org), [
+                {"user_id": row["user_id"], "org": org, "certificate_id": row["certificate_id"]} for row in params
+            ])
+
+    def approved_certificates(self, user_id, org, new_only=False):
+        self._ensure_table(f"certificate_data_{org}")
+        self._ensure_table("certificate_exports")
+        with self.engine.connect() as conn:
+            result = conn.execute(approved_certificates_query(org, new_only), {"user_id": user_id, "org": org})
+            return [dict(row) for row in result.mappings()]
+
+    def find_certificate(self, certificate_id, orgs):
+        """Return the certificate with this ID from the first org table that has it (plus its org), else None."""
+        for org in orgs:
+            self._ensure_table(f"certificate_data_{org}")
+        with self.engine.connect() as conn:
+            for org in orgs:
+                row = conn.execute(certificate_lookup_query(org), {"certificate_id": certificate_id}).mappings().first()
+                if row is not None:
+                    return dict(row, org=org)
+        return None
+
+    def mark_certificates_exported(self, user_id, org, certificate_ids):
+        if not certificate_ids:
+            return
+        self._ensure_table("certificate_exports")
+        params = [
+            {"user_id": user_id, "org": org, "certificate_id": cert_id, "exported_at": datetime.now()}
+            for cert_id in certificate_ids
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(DELETE_EXPORT, params)
+            conn.execute(INSERT_EXPORT, params)
+
+class MySQLStorage(SQLStorage):
+    """The shared MySQL server; users and certificate_data_{org} are provisioned outside the app."""
+
+    def _create_table(self, conn, table):
+        if table.startswith("certificate_data_"):
+            self._migrate_certificate_table(conn, table)
+        elif table == "users":
+            self._migrate_users_table(conn)
+        else:
+            super()._create_table(conn, table)
+
+    def _migrate_users_table(self, conn):
+        # Logins look users up by username, and salted password hashes
+        # (see auth.py) are longer than the 64 hex digits of the old SHA-256.
+        try:
+            inspector = inspect(conn)
+            indexes = inspector.get_indexes("users") + inspector.get_unique_constraints("users")
+            if not any(index["column_names"][:1] == ["username"] for index in indexes):
+                conn.exec_driver_sql("CREATE INDEX users_username ON users (username)")
+            column = next(c for c in inspector.get_columns("users") if c["name"] == "password_hash")
+            length = getattr(column["type"], "length", None)
+            if conn.dialect.name == "mysql" and length is not None and length < 255:
+                conn.exec_driver_sql("ALTER TABLE users MODIFY password_hash VARCHAR(255) NOT NULL")
+        except Exception as e:
+            logger.warning("Could not migrate the users table: %s", e)
+
+    def _create_engine(self):
+        config = _connection_config()
+        return create_engine(
+            _database_url(config),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+            **config.get("create_engine_kwargs", {}),
+        )
+
+class SQLiteStorage(SQLStorage):
+    """Embedded database file in WAL mode, so readers never wait on the (single) writer."""
+
+    def __init__(self, path=SQLITE_PATH):
+        super().__init__()
+        self.path = path
+
+    def _create_engine(self):
+        engine = create_engine(f"sqlite:///{self.path}", pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+        @event.listens_for(engine, "connect")
+        def _configure(dbapi_connection, _):
+            # Let SQLAlchemy issue BEGIN itself (below) so savepoints work.
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+
+        @event.listens_for(engine, "begin")
+        def _begin(conn):
+            conn.exec_driver_sql("BEGIN")
+
+        return engine
+
+    def _create_table(self, conn, table):
+        if table == "users":
+            columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(users)")]
+            if columns and "id" not in columns:
+                # certificates.db used to ship an older users table; keep it aside.
+                conn.exec_driver_sql("ALTER TABLE users RENAME TO legacy_users")
+            conn.exec_driver_sql("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username VARCHAR(255) NOT NULL UNIQUE,
+                    email VARCHAR(255),
+                    password_hash VARCHAR(255) NOT NULL
+                )
+            """)
+        elif table.startswith("certificate_data_"):
+            conn.exec_driver_sql(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    {", ".join(f"{column} TEXT" for column in CERTIFICATE_COLUMNS[1:])},
+                    status VARCHAR(32) NOT NULL DEFAULT 'pending_review'
+                )
+            """)
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {table}_user_status ON {table} (user_id, status)")
+            self._migrate_certificate_table(conn, table)
+        else:
+            super()._create_table(conn, table)
+
+STORAGE_BACKENDS = {"mysql": MySQLStorage, "sqlite": SQLiteStorage}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND not in STORAGE_BACKENDS:
+                    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND!r}")
+                _storage = STORAGE_BACKENDS[STORAGE_BACKEND]()
+    return _storage
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------- BACKGROUND CERTIFICATE JOBS ----------
+# Batches run on a small thread pool (rendering itself still fans out to the
+# process pool in batch.py). Their status, progress, per-row errors and the
+# finished archive are kept in a local SQLite job store, which pages poll;
+# a rerun of the page never abandons or repeats a running batch.
+#
+# A job only runs inside the process that queued it. That process stamps a
+# heartbeat on its queued and running jobs every JOB_HEARTBEAT_SECONDS; an
+# active job whose heartbeat is older than JOB_STALE_SECONDS lost its
+# process (a restart or crash) and is marked failed when the store is opened
+# and before every read, so its owner can start a new batch.
+
+JOB_DIR = os.environ.get("CERT_JOB_DIR", os.path.join(tempfile.gettempdir(), "certificate_jobs"))
+JOB_WORKERS = int(os.environ.get("CERT_JOB_WORKERS", "2"))
+JOB_MAX_AGE_SECONDS = int(os.environ.get("CERT_JOB_MAX_AGE_SECONDS", str(24 * 60 * 60)))
+
+JOB_HEARTBEAT_SECONDS = int(os.environ.get("CERT_JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = int(os.environ.get("CERT_JOB_STALE_SECONDS", "60"))
+
+ACTIVE_STATUSES = ("queued", "running")
+RUNNER_ID = uuid.uuid4().hex
+INTERRUPTED_MESSAGE = "The app restarted or stopped while this batch was running; please generate it again."
+
+class JobStore:
+    def __init__(self, directory=JOB_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, "jobs.db")
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(self.directory, exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as db:
+                        db.execute("PRAGMA journal_mode=WAL")
+                        db.execute("""
+                            CREATE TABLE IF NOT EXISTS jobs (
+                                id TEXT PRIMARY KEY,
+                                owner TEXT NOT NULL,
+                                status TEXT NOT NULL,
+                                processed INTEGER NOT NULL DEFAULT 0,
+                                progress REAL NOT NULL DEFAULT 0,
+                                message TEXT,
+                                archive_path TEXT,
+                                file_name TEXT,
+                                created_at REAL NOT NULL,
+                                started_at REAL,
+                                finished_at REAL,
+                                runner TEXT,
+                                heartbeat_at REAL
+                            )
+                        """)
+                        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+                        for column, kind in (("runner", "TEXT"), ("heartbeat_at", "REAL")):
+                            if column not in columns:
+                                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                        db.execute("CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, created_at)")
+                        db.execute("""
+                            CREATE TABLE IF NOT EXISTS job_errors (
+                                job_id TEXT NOT NULL,
+                                message TEXT NOT NULL
+                            )
+                        """)
+                        db.execute("CREATE INDEX IF NOT EXISTS job_errors_job ON job_errors (job_id)")
+                        self._fail_stale(db)
+                    self._initialized = True
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _fail_stale(self, db):
+        now = time.time()
+        db.execute(
+            "UPDATE jobs SET status = 'failed', message = ?, finished_at = ? "
+            "WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+            (INTERRUPTED_MESSAGE, now, *ACTIVE_STATUSES, now - JOB_STALE_SECONDS)
+        )
+
+    def heartbeat(self, runner=RUNNER_ID):
+        """Mark the active jobs of this process as still alive."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE runner = ? AND status IN (?, ?)",
+                (time.time(), runner, *ACTIVE_STATUSES)
+            )
+
+    def create(self, owner):
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            cutoff = time.time() - JOB_MAX_AGE_SECONDS
+            db.execute("DELETE FROM job_errors WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)", (cutoff,))
+            db.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+            now = time.time()
+            db.execute(
+                "INSERT INTO jobs (id, owner, status, created_at, runner, heartbeat_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, owner, now, RUNNER_ID, now)
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_error(self, job_id, message):
+        with self._connect() as db:
+            db.execute("INSERT INTO job_errors (job_id, message) VALUES (?, ?)", (job_id, message))
+
+    def get(self, job_id):
+        with self._connect() as db:
+            self._fail_stale(db)
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest(self, owner):
+        with self._connect() as db:
+            self._fail_stale(db)
+            row = db.execute(
+                "SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT 1", (owner,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def errors(self, job_id):
+        with self._connect() as db:
+            rows = db.execute("SELECT message FROM job_errors WHERE job_id = ? ORDER BY rowid", (job_id,))
+            return [row["message"] for row in rows]
+
+class JobProgress:
+    """Handle a running job uses to report back to the job store."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.processed = 0
+
+    def error(self, message):
+        self.store.add_error(self.job_id, message)
+
+    def advance(self, rows, progress):
+        self.processed += rows
+        self.store.update(self.job_id, processed=self.processed, progress=progress)
+
+    def finish(self, archive_path, file_name, message=None):
+        self.store.update(self.job_id, archive_path=archive_path, file_name=file_name, message=message)
+
+job_store = JobStore()
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="certificate-job")
+_heartbeat_thread = None
+_heartbeat_lock = threading.Lock()
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            job_store.heartbeat()
+        except sqlite3.Error:
+            pass  # next beat; a job only goes stale after several missed ones
+
+def _start_heartbeat():
+    global _heartbeat_thread
+    with _heartbeat_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="certificate-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+def _run(job_id, fn, args):
+    job_store.update(job_id, status="running", started_at=time.time())
+    try:
+        fn(JobProgress(job_store, job_id), *args)
+    except Exception as e:
+        job_store.update(job_id, status="failed", message=str(e), finished_at=time.time())
+    else:
+        job_store.update(job_id, status="done", progress=1.0, finished_at=time.time())
+
+def submit_job(owner, fn, *args):
+    """Queue fn(progress, *args) on the background pool and return its job ID."""
+    _start_heartbeat()
+    job_id = job_store.create(owner)
+    _executor.submit(_run, job_id, fn, args)
+    return job_id
+
+def save_job_input(data, suffix=".csv"):
+    """Copy an upload to JOB_DIR so a job can read it after the request that sent it is gone."""
+    os.makedirs(JOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=JOB_DIR)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# ---------- PIPELINE METRICS ----------
+# Each upload or approved-download batch gets a BatchMetrics that sums wall
+# time per stage (CSV parsing, cleaning, layout, PDF assembly, ZIP writes,
+# database work, ...) and counts rows, certificates and errors. Finished
+# batches are kept for the admin panel and folded into process-wide totals,
+# which can also go out as one JSON log line per batch (CERT_METRICS_LOG=1)
+# or as Prometheus text (CERT_METRICS_PROM_FILE, for a textfile collector).
+# With CERT_METRICS=0 every call is a no-op.
+
+METRICS_ENABLED = os.environ.get("CERT_METRICS", "1") != "0"
+METRICS_LOG = os.environ.get("CERT_METRICS_LOG", "0") == "1"
+METRICS_PROM_FILE = os.environ.get("CERT_METRICS_PROM_FILE")
+RECENT_BATCHES = int(os.environ.get("CERT_METRICS_RECENT_BATCHES", "20"))
+
+logger = logging.getLogger("certificate_metrics")
+if METRICS_LOG and not logger.handlers:
+    # One JSON object per line on stderr, whatever the host's logging setup.
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+class _Stage:
+    __slots__ = ("batch", "name", "started")
+
+    def __init__(self, batch, name):
+        self.batch = batch
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.batch.add_time(self.name, time.perf_counter() - self.started)
+
+class BatchMetrics:
+    def __init__(self, flow, label=None):
+        self.flow = flow
+        self.label = label
+        self.started_at = time.time()
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        self.finished = False
+
+    def stage(self, name):
+        """Context manager adding the time spent inside it to stage `name`."""
+        return _Stage(self, name)
+
+    def add_time(self, name, seconds, calls=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        return {
+            "flow": self.flow,
+            "label": self.label,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.time() - self.started_at, 6),
+            "stages": {
+                name: {"seconds": round(seconds, 6), "calls": self.calls[name]}
+                for name, seconds in self.seconds.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            registry.record(self)
+
+class _NullBatchMetrics:
+    """Stands in for BatchMetrics when metrics are disabled."""
+
+    _stage = nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def add_time(self, name, seconds, calls=1):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def finish(self):
+        pass
+
+NULL_METRICS = _NullBatchMetrics()
+
+def new_batch(flow, label=None):
+    return BatchMetrics(flow, label) if METRICS_ENABLED else NULL_METRICS
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_BATCHES)
+        self.batches = {}
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    def record(self, batch):
+        summary = batch.summary()
+        with self._lock:
+            self.recent.appendleft(summary)
+            self.batches[batch.flow] = self.batches.get(batch.flow, 0) + 1
+            for name, stage in summary["stages"].items():
+                key = (batch.flow, name)
+                self.seconds[key] = self.seconds.get(key, 0.0) + stage["seconds"]
+                self.calls[key] = self.calls.get(key, 0) + stage["calls"]
+            for name, value in summary["counters"].items():
+                key = (batch.flow, name)
+                self.counters[key] = self.counters.get(key, 0) + value
+        if METRICS_LOG:
+            logger.info(json.dumps(summary))
+        if METRICS_PROM_FILE:
+            self.write_prometheus(METRICS_PROM_FILE)
+
+    def recent_batches(self):
+        with self._lock:
+            return list(self.recent)
+
+    def prometheus_text(self):
+        with self._lock:
+            lines = [
+                "# HELP certificate_batches_total Finished certificate batches.",
+                "# TYPE certificate_batches_total counter",
+            ]
+            lines += [f'certificate_batches_total{{flow="{flow}"}} {n}' for flow, n in sorted(self.batches.items())]
+            lines += [
+                "# HELP certificate_stage_seconds_total Wall time spent per pipeline stage.",
+                "# TYPE certificate_stage_seconds_total counter",
+            ]
+            lines += [
+                f'certificate_stage_seconds_total{{flow="{flow}",stage="{stage}"}} {seconds:.6f}'
+                for (flow, stage), seconds in sorted(self.seconds.items())
+            ]
+            lines += [
+                "# HELP certificate_stage_calls_total Timed calls per pipeline stage.",
+                "# TYPE certificate_stage_calls_total counter",
+            ]
+            lines += [
+                f'certificate_stage_calls_total{{flow="{flow}",stage="{stage}"}} {calls}'
+                for (flow, stage), calls in sorted(self.calls.items())
+            ]
+            lines += [
+                "# HELP certificate_events_total Rows, certificates and errors seen by the pipeline.",
+                "# TYPE certificate_events_total counter",
+            ]
+            lines += [
+                f'certificate_events_total{{flow="{flow}",event="{name}"}} {value}'
+                for (flow, name), value in sorted(self.counters.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".prom.tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+registry = MetricsRegistry()
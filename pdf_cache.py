@@ -0,0 +1,90 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+# ---------- RENDERED CERTIFICATE CACHE ----------
+# Content-addressed cache of rendered certificates on local disk. Entries are
+# the compressed page streams from CertificateTemplate.render_content (a few
+# KB each; the template supplies the rest of the PDF), keyed by a hash of the
+# template fingerprint (layout version, org, variant, asset files and mtimes)
+# and the certificate fields. Reads refresh an entry's mtime; once the cache
+# grows past its budget the least recently used entries are evicted.
+
+PDF_CACHE_DIR = os.environ.get(
+    "CERT_PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "certificate_pdf_cache")
+)
+PDF_CACHE_MAX_BYTES = int(os.environ.get("CERT_PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+class PdfCache:
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key(self, template, fields):
+        digest = hashlib.sha256(template.fingerprint.encode())
+        digest.update(repr(tuple(fields)).encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def put(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._total_bytes += len(content)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        # Trim to 90% of the budget so eviction does not run on every put.
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+pdf_cache = PdfCache()
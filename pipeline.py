@@ -0,0 +1,505 @@
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, date
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import db
+from assets import ORG_ASSETS
+from batch import OUTPUT_FORMATS, RenderPool, render_certificate_pages
+from metrics import NULL_METRICS
+from rendering import get_certificate_template
+
+# ---------- CERTIFICATE PIPELINE ----------
+# Cleaning, certificate IDs, rendering, zipping and ingestion of uploaded
+# intern data, shared by the Streamlit app, its background jobs and the
+# command-line batch mode. Nothing here imports streamlit: problems with
+# individual rows go to a report_error callback (st.error in the app).
+
+logger = logging.getLogger(__name__)
+
+# ---------- DOMAIN SHORTFORMS ----------
+
+DOMAIN_SHORTFORMS = {
+    "Python Fullstack": "PY",
+    "Web Development": "WD",
+    "Cybersecurity": "CS",
+    "Java Full Stack": "JFSD",
+    "Artificial Intelligence": "AIML",
+    "Internet of Things":"IOT"
+}
+
+# ---------- FLEXIBLE COLUMN MAPPING AND DATE FIX ----------
+
+EXPECTED_COLUMNS = {
+    "Prefix":["Prefix","prefix"],
+    "Name": ["Name", "Full Name", "Student Name"],
+    "USN": ["USN", "University Serial Number", "ID"],
+    "College": ["College", "Institution", "University"],
+    "Email": ["Email", "Email Address", "E-mail"],
+    "Phone": ["Phone", "Phone Number", "Contact"],
+    "Registered": ["Registered", "Registration Date"],
+    "Start Date": ["Start Date", "Internship Start", "Start"],
+    "End Date": ["End Date", "Internship End", "End"],
+    "Program": ["Program", "Course", "Internship Program"],
+    "Mode": ["Mode", "Internship Mode"],
+    "Payment Status": ["Payment Status", "Payment", "Paid"],
+    "Certificate Issued Date": ["Certificate Issued Date", "Issue Date", "Cert Date"],
+    "Intern ID": ["Intern ID", "ID", "Internship ID"],
+    "Topic": ["Topic", "Project Topic", "Internship Topic"],
+    "Certificate ID": ["Certificate ID", "Cert ID", "Certificate Number"],
+    "Domain": ["Domain", "Internship Domain", "Course Domain"]
+}
+
+def parse_date_safe(val):
+    if val is None or (isinstance(val, float) and pd.isna(val)) or str(val).strip() == "":
+        return None
+    try:
+        dt = pd.to_datetime(val, dayfirst=True, errors='coerce')
+        if pd.isna(dt):
+            return None
+        return dt.strftime("%Y-%m-%d")
+    except Exception:
+        return None
+
+def strip_strings(col):
+    # .str.strip() yields NaN for non-string cells; put those back untouched.
+    try:
+        stripped = col.str.strip()
+    except AttributeError:
+        return col
+    return stripped.where(stripped.notna(), col)
+
+def parse_date_column(col):
+    """parse_date_safe over a whole column, parsing each distinct value once."""
+    present = (col.notna() & (col.astype(str).str.strip() != "")).to_numpy()
+    codes, uniques = pd.factorize(col[present])
+    try:
+        parsed = pd.to_datetime(pd.Series(uniques, dtype=object), dayfirst=True, errors='coerce', format='mixed')
+        formatted = parsed.dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+        formatted[parsed.isna().to_numpy()] = None
+    except Exception:
+        # e.g. mixed timezone offsets, which the column parser refuses
+        formatted = np.array([parse_date_safe(val) for val in uniques], dtype=object)
+    result = np.full(len(col), None, dtype=object)
+    result[present] = formatted[codes]
+    # Let pandas infer the dtype, as Series.apply did.
+    return pd.Series(result.tolist(), index=col.index)
+
+def map_and_clean_columns(df):
+    mapped_df = pd.DataFrame()
+    for standard_col, aliases in EXPECTED_COLUMNS.items():
+        found = None
+        for alias in aliases:
+            if alias in df.columns:
+                found = alias
+                break
+        if found:
+            mapped_df[standard_col] = df[found]
+        else:
+            mapped_df[standard_col] = None
+    mapped_df = mapped_df.where(pd.notnull(mapped_df), None)
+    for col in mapped_df.columns:
+        mapped_df[col] = strip_strings(mapped_df[col])
+    for date_col in ["Start Date", "End Date", "Certificate Issued Date"]:
+        if date_col in mapped_df.columns:
+            mapped_df[date_col] = parse_date_column(mapped_df[date_col])
+    return mapped_df
+
+def generate_certificate_id(domain_short, usn, date_obj, org):
+    month_short = date_obj.strftime("%b").upper()  # e.g., 'Jun' → 'JUN'
+    year_short = date_obj.strftime("%y")           # e.g., 2025 → '25'
+    if str(org).lower() == "nxtalign":
+        return f"NXT{domain_short}{usn}{month_short}{year_short}"
+    else:
+        return f"DL{domain_short}{usn}{month_short}{year_short}"
+
+def generate_certificate_ids(df, domain_short, org):
+    """generate_certificate_id for every row of a cleaned DataFrame at once.
+
+    Returns a Series of IDs aligned with df, NaN where the End Date is
+    missing or invalid. Collisions are resolved by CertificateIdAllocator.
+    """
+    end = pd.to_datetime(df["End Date"], errors="coerce", format="ISO8601")
+    prefix = "NXT" if str(org).lower() == "nxtalign" else "DL"
+    return (
+        # map(str), not astype(str): a missing USN reads "None"/"nan", as in the f-string.
+        prefix + domain_short + df["USN"].map(str)
+        + end.dt.strftime("%b").str.upper() + end.dt.strftime("%y")
+    )
+
+_INTEGRAL_DECIMAL = re.compile(r"(\d+)\.0+")
+
+def _usn_key(usn):
+    # A numeric USN column reads as float in a chunk with blank cells, and the
+    # database keeps it as text ("101.0"); both should compare equal to 101.
+    usn = _canonical(usn)
+    if usn is None or (isinstance(usn, float) and pd.isna(usn)):
+        return ""
+    text = str(usn).strip().upper()
+    match = _INTEGRAL_DECIMAL.fullmatch(text)
+    return match.group(1) if match else text
+
+def _intern_key(usn, name):
+    # Who a certificate ID belongs to: the USN, or the name for rows without
+    # one. Used on batch rows and stored rows alike, so they normalise the same.
+    usn = _usn_key(usn)
+    if usn:
+        return ("usn", usn)
+    return ("name", str(name).strip().lower())
+
+class CertificateIdAllocator:
+    """Hands out unique certificate IDs across the chunks of one upload.
+
+    Two rows with the same ID (a repeated USN, or the "nan" that a blank
+    USN puts in the ID) are told apart with a suffix: the first row in the
+    upload keeps the ID, the next gets ID-2, then ID-3, and so on. An ID
+    already stored for a different intern (by USN, or by name without one)
+    is skipped the same way, while one stored for the same intern is reused
+    so that re-uploads update it. Base IDs are checked against the database
+    with one IN query per chunk; a base that is contested (repeated, or
+    stored for someone else) has all its stored suffixes loaded once for the
+    whole upload, and its rows are then numbered in a single pass.
+    """
+
+    def __init__(self, org):
+        self.org = org
+        self.assigned = set()
+        self.stored = {}     # contested base ID -> {suffix: stored row}
+        self.next_free = {}  # contested base ID -> lowest suffix that may be free
+
+    def assign(self, base_ids, keys):
+        """Return (ids, existing): an ID per base ID (None stays None) and the stored rows of those IDs."""
+        ids = [None] * len(base_ids)
+        existing = {}
+        rows_by_base = {}
+        for i, base in enumerate(base_ids):
+            if base is not None:
+                rows_by_base.setdefault(base, []).append(i)
+        storage = db.get_storage()
+        fresh = [base for base in rows_by_base if base not in self.stored]
+        found = storage.existing_certificates(self.org, fresh) if fresh else {}
+        contested = []
+        for base in fresh:
+            rows = rows_by_base[base]
+            record = found.get(base)
+            if len(rows) == 1 and base not in self.assigned and (
+                record is None or _intern_key(record["usn"], record["name"]) == keys[rows[0]]
+            ):
+                self.assigned.add(base)
+                ids[rows[0]] = base
+                if record is not None:
+                    existing[base] = record
+            else:
+                contested.append(base)
+        if contested:
+            self._load_suffixes(storage.suffixed_certificates(self.org, contested), contested)
+        for base, rows in rows_by_base.items():
+            if base in self.stored:
+                for i, cert_id in zip(rows, self._number(base, [keys[i] for i in rows])):
+                    ids[i] = cert_id
+                    record = self.stored[base].get(_suffix_of(base, cert_id))
+                    if record is not None:
+                        existing[cert_id] = record
+        return ids, existing
+
+    def _load_suffixes(self, found, bases):
+        for base in bases:
+            self.stored[base] = {}
+            self.next_free[base] = 1
+        for cert_id, record in found.items():
+            base, suffix = cert_id, 1
+            if base not in self.stored:
+                base, _, tail = cert_id.rpartition("-")
+                if base not in self.stored or not tail.isdigit() or int(tail) < 2:
+                    continue
+                suffix = int(tail)
+            self.stored[base][suffix] = record
+
+    def _number(self, base, keys):
+        stored = self.stored[base]
+        own = {}
+        for suffix in sorted(stored):
+            if _suffixed(base, suffix) not in self.assigned:
+                record = stored[suffix]
+                own.setdefault(_intern_key(record["usn"], record["name"]), []).append(suffix)
+        ids = []
+        for key in keys:
+            if own.get(key):
+                suffix = own[key].pop(0)
+            else:
+                suffix = self.next_free[base]
+                while suffix in stored or _suffixed(base, suffix) in self.assigned:
+                    suffix += 1
+                self.next_free[base] = suffix + 1
+            cert_id = _suffixed(base, suffix)
+            self.assigned.add(cert_id)
+            ids.append(cert_id)
+        return ids
+
+def _suffixed(cert_id, suffix):
+    return cert_id if suffix == 1 else f"{cert_id}-{suffix}"
+
+def _suffix_of(base, cert_id):
+    return 1 if cert_id == base else int(cert_id[len(base) + 1:])
+
+@lru_cache(maxsize=4096, typed=True)
+def format_date(dt):
+    if isinstance(dt, str):
+        try:
+            dt = pd.to_datetime(dt).date()
+        except Exception:
+            return dt
+    if isinstance(dt, date) and not isinstance(dt, datetime):
+        dt = datetime(dt.year, dt.month, dt.day)
+    day = dt.day
+    if 4 <= day % 100 <= 20:
+        suffix = "th"
+    else:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
+    return f"{day}{suffix} {dt:%B %Y}"
+
+def generate_certificate_pdf(
+    prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id,
+    org, logo_path=None, signature_path=None, seal_path=None, cert_type=None,
+    activity_type="Internship", duration="15 Weeks", report_error=logger.error
+):
+    template = get_certificate_template(
+        org, cert_type, activity_type, duration,
+        logo_path=logo_path, signature_path=signature_path, seal_path=seal_path
+    )
+    for message in template.asset_errors:
+        report_error(message)
+    return template.render(prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id)
+
+INSERT_CHUNK_SIZE = 500
+CSV_CHUNK_ROWS = 1000
+
+def certificate_insert_params(user_id, row):
+    return {
+        "user_id": user_id,
+        "prefix": row["Prefix"],
+        "name": row["Name"],
+        "usn": row["USN"],
+        "college": row["College"],
+        "email": row["Email"],
+        "phone": row["Phone"],
+        "registered": row["Registered"],
+        "start_date": row["Start Date"],
+        "end_date": row["End Date"],
+        "program": row["Program"],
+        "mode": row["Mode"],
+        "payment_status": row["Payment Status"],
+        "certificate_issued_date": row["Certificate Issued Date"],
+        "topic": row["Topic"],
+        "domain": row.get("Domain", ""),
+        "certificate_id": row["Certificate ID"],
+        "content_hash": row.get("Content Hash")
+    }
+
+def _canonical(value):
+    # The same CSV value can come back as int, float or numpy scalar
+    # depending on the rest of its chunk; hash them all alike.
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def row_content_hash(row, cert_type, activity_type, duration):
+    """Hash of everything a row's certificate and database record are made from."""
+    content = certificate_insert_params(None, row)
+    del content["user_id"], content["content_hash"]
+    content = {name: _canonical(value) for name, value in content.items()}
+    content.update(cert_type=cert_type, activity_type=activity_type, duration=duration)
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def insert_certificate_data_bulk(user_id, df, org, chunk_size=INSERT_CHUNK_SIZE):
+    """Insert every row of a cleaned DataFrame; returns the rejected rows as (row, error) pairs."""
+    rows = df.to_dict("records")
+    params = [certificate_insert_params(user_id, row) for row in rows]
+    return [(rows[index], error) for index, error in db.get_storage().insert_certificates(org, params, chunk_size)]
+
+def update_certificate_data_bulk(user_id, rows, org):
+    db.get_storage().update_certificates(org, [certificate_insert_params(user_id, row) for row in rows])
+
+def generate_certificates_for_chunk(
+    cleaned_df, user_id, org, domain, cert_type, activity_type, duration, writer,
+    report_error=logger.error, metrics=NULL_METRICS, workers=None, include_unchanged=False, allocator=None,
+    pool=None
+):
+    """Render one cleaned chunk of an upload into writer and store it, passing per-row errors to report_error.
+
+    writer is one of batch.OUTPUT_FORMATS (a ZIP or a merged PDF). Rows
+    whose certificate ID is already stored with the same content hash are
+    left alone (and only rendered into the output with include_unchanged);
+    changed rows are re-rendered and updated in place. allocator (a
+    CertificateIdAllocator shared by all chunks of the upload) keeps
+    certificate IDs unique, and pool (a batch.RenderPool) lets the chunks
+    share rendering workers. Returns counts of "inserted", "updated" and
+    "unchanged" rows.
+    """
+    if allocator is None:
+        allocator = CertificateIdAllocator(org)
+    logo_path = ORG_ASSETS[org]["logo"]
+    sig_path = ORG_ASSETS[org]["signature"]
+    seal_path = ORG_ASSETS[org]["seal"]
+
+    rows = []
+    jobs = []
+    with metrics.stage("certificate_id"):
+        base_ids = generate_certificate_ids(cleaned_df, DOMAIN_SHORTFORMS[domain], org)
+        for (_, row), base_id in zip(cleaned_df.iterrows(), base_ids):
+            if pd.isna(base_id):
+                report_error(f"Error generating certificate for {row['Name']}: missing or invalid End Date")
+                continue
+            try:
+                job = dict(
+                    prefix=row["Prefix"],
+                    name=row["Name"],
+                    usn=row["USN"],
+                    college=row["College"],
+                    start_date_str=format_date(row["Start Date"]),
+                    end_date_str=format_date(row["End Date"]),
+                    topic=row["Topic"],
+                    cert_id=base_id,
+                    org=org,
+                    logo_path=logo_path,
+                    signature_path=sig_path,
+                    seal_path=seal_path,
+                    cert_type=cert_type,
+                    activity_type=activity_type,
+                    duration=duration
+                )
+            except Exception as e:
+                report_error(f"Error generating certificate for {row['Name']}: {str(e)}")
+                continue
+            rows.append(row)
+            jobs.append(job)
+
+    with metrics.stage("dedupe"):
+        cert_ids, existing = allocator.assign(
+            [job["cert_id"] for job in jobs], [_intern_key(row["USN"], row["Name"]) for row in rows]
+        )
+    metrics.count("suffixed_ids", sum(cert_id != job["cert_id"] for cert_id, job in zip(cert_ids, jobs)))
+    for row, job, cert_id in zip(rows, jobs, cert_ids):
+        job["cert_id"] = row["Certificate ID"] = cert_id
+        row["Content Hash"] = row_content_hash(row, cert_type, activity_type, duration)
+
+    pending_rows = []
+    pending_jobs = []
+    unchanged = 0
+    for row, job in zip(rows, jobs):
+        found = existing.get(row["Certificate ID"])
+        if found is not None:
+            if int(found["user_id"]) != user_id:
+                report_error(
+                    f"Error generating certificate for {row['Name']}: "
+                    f"certificate ID {row['Certificate ID']} was already issued by another user"
+                )
+                continue
+            if found["content_hash"] == row["Content Hash"]:
+                unchanged += 1
+                if not include_unchanged:
+                    continue
+        pending_rows.append(row)
+        pending_jobs.append(job)
+    metrics.count("unchanged", unchanged)
+
+    new_rows = []
+    changed_rows = []
+    pages = render_certificate_pages(pending_jobs, workers=workers, metrics=metrics, pool=pool)
+    for row, (template, content, asset_errors, error) in zip(pending_rows, pages):
+        for message in asset_errors:
+            report_error(message)
+        if error is not None:
+            report_error(f"Error generating certificate for {row['Name']}: {error}")
+            continue
+        try:
+            pdf_filename = f"{row['Name'].replace(' ', '_')}_{row['Certificate ID']}.pdf"
+            writer.add(pdf_filename, template, content)
+        except Exception as e:
+            report_error(f"Error generating certificate for {row['Name']}: {str(e)}")
+            continue
+        found = existing.get(row["Certificate ID"])
+        if found is None:
+            new_rows.append(row)
+        elif found["content_hash"] != row["Content Hash"]:
+            changed_rows.append(row)
+
+    inserted = 0
+    if new_rows:
+        try:
+            with metrics.stage("db_insert"):
+                rejected = insert_certificate_data_bulk(user_id, pd.DataFrame(new_rows), org)
+        except Exception as e:
+            rejected = [(row, str(e)) for row in new_rows]
+        for row, error in rejected:
+            report_error(f"Error generating certificate for {row['Name']}: {error}")
+        inserted = len(new_rows) - len(rejected)
+    updated = 0
+    if changed_rows:
+        try:
+            with metrics.stage("db_update"):
+                update_certificate_data_bulk(user_id, changed_rows, org)
+            updated = len(changed_rows)
+        except Exception as e:
+            for row in changed_rows:
+                report_error(f"Error generating certificate for {row['Name']}: {str(e)}")
+    metrics.count("certificates", inserted + updated)
+    metrics.count("updated", updated)
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
+
+def program_name_of(df):
+    if "Program" in df.columns and not df["Program"].isnull().all():
+        return str(df["Program"].iloc[0])
+    return "Certificates"
+
+def archive_file_name(org, program_name, extension=".zip"):
+    now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{org}_{program_name}_{now_str}{extension}".replace(" ", "_")
+
+def generate_certificates_from_csv(
+    csv_file, output_path, user_id, org, domain, cert_type, activity_type, duration,
+    report_error=logger.error, metrics=NULL_METRICS, workers=None, chunk_rows=CSV_CHUNK_ROWS, on_chunk=None,
+    include_unchanged=False, output_format="zip"
+):
+    """Stream a CSV (path or binary file) into certificates at output_path, chunk by chunk.
+
+    output_format is a batch.OUTPUT_FORMATS key: "zip" (one PDF per
+    certificate) or "pdf" (all certificates as pages of one merged PDF).
+
+    on_chunk(rows) is called after each chunk with the number of rows it had.
+    Returns the batch's "program_name" (for naming the archive) and its
+    "rows", "inserted", "updated" and "unchanged" counts.
+    """
+    program_name = None
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    allocator = CertificateIdAllocator(org)
+    with OUTPUT_FORMATS[output_format](output_path, metrics=metrics) as writer, RenderPool(workers) as pool:
+        reader = pd.read_csv(csv_file, chunksize=chunk_rows)
+        while True:
+            with metrics.stage("read_csv"):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+            with metrics.stage("clean"):
+                cleaned_df = map_and_clean_columns(chunk)
+                cleaned_df["Domain"] = domain
+            if program_name is None:
+                program_name = program_name_of(cleaned_df)
+            counts = generate_certificates_for_chunk(
+                cleaned_df, user_id, org, domain, cert_type, activity_type, duration, writer,
+                report_error=report_error, metrics=metrics, workers=workers, include_unchanged=include_unchanged,
+                allocator=allocator, pool=pool
+            )
+            for name, value in counts.items():
+                summary[name] += value
+            summary["rows"] += len(cleaned_df)
+            metrics.count("rows", len(cleaned_df))
+            if on_chunk is not None:
+                on_chunk(len(cleaned_df))
+    summary["program_name"] = program_name or "Certificates"
+    return summary
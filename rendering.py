@@ -0,0 +1,464 @@
+import hashlib
+import os
+import re
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from fpdf import FPDF, FPDF_VERSION
+from assets import load_image
+
+# ---------- CACHED-IMAGE FPDF ----------
+
+class CachedImageFPDF(FPDF):
+    """FPDF that takes JPEG/PNG images from the process-wide cache instead of re-parsing them."""
+
+    def _parsejpg(self, filename):
+        return load_image(filename).pdf_info()
+
+    def _parsepng(self, name):
+        if name.startswith("http://") or name.startswith("https://"):
+            return FPDF._parsepng(self, name)
+        info = load_image(name).pdf_info()
+        # Soft masks need PDF 1.4; fpdf normally bumps the version while parsing.
+        if "smask" in info and self.pdf_version < "1.4":
+            self.pdf_version = "1.4"
+        return info
+
+# ---------- ORGANIZATION LETTERHEADS ----------
+
+ORG_LETTERHEADS = {
+    "DLithe": {
+        "name": "DLithe Consultancy Services Pvt. Ltd.",
+        "cin": "CIN: U72900KA2019PTC121035",
+        "footer1": "           Registered office: #51, 1st Main, 6th Block, 3rd Phase, BSK 3rd Stage, Bangaluru -560085",
+        "footer2": "Development Centeres: Ujire | Moodabidre | Manipal | Mangaluru | Belagavi",
+        "footer3": "M: 9008815252 | www.dlithe.com | info@dlithe.com",
+        "for_text": "For DLithe Consultancy Services Pvt. Ltd."
+    },
+    "nxtAlign": {
+        "name": "nxtAlign Innovation Pvt.Ltd.",
+        "cin": "CIN: U73100KA2022PTC165879",
+        "footer1": "           Registered office: H No.4061/B 01,Near Chidambar Ashram Health Camp Betageri,Gadag KA 582102",
+        "footer2": "Development Centeres: Ujire | AIC NITTE",
+        "footer3": "M: 8553300781 | www.nxtalign.com | nxtalign@gmail.com",
+        "for_text": "For nxtAlign Innovation Pvt.Ltd."
+    }
+}
+
+def clean_text(text):
+    if not isinstance(text, str):
+        return ""
+    return (
+        text.replace("’", "'")
+            .replace("‘", "'")
+            .replace("“", '"')
+            .replace("”", '"')
+    )
+
+# ---------- CERTIFICATE TEMPLATES ----------
+# Everything on a certificate except the ID line, the body paragraphs and
+# (only when the body runs long) the seal/signature block is the same for a
+# given org, cert_type, activity_type and duration. A template draws that
+# once, keeps the static parts of the page content stream and the serialized
+# font/image objects, and per student only lays out the variable text and
+# patches the xref offsets.
+
+BORDER_MARGIN = 8
+PAGE_MARGIN = BORDER_MARGIN + 8
+# Bump when the layout changes so cached renders (see pdf_cache) are not reused.
+TEMPLATE_VERSION = 1
+CONTENT_STREAM_HEADER = "%d 0 obj\n<</Filter /FlateDecode /Length %d>>\nstream\n"
+CONTENT_STREAM_FOOTER = "\nendstream\nendobj\n"
+
+class CertificateTemplate:
+    def __init__(self, org, cert_type, activity_type, duration,
+                 logo_path=None, signature_path=None, seal_path=None):
+        self.org = org
+        self.provisional = bool(cert_type and cert_type.lower() == "provisional")
+        self.activity_type = activity_type
+        self.duration = duration
+        self.logo_path = logo_path
+        self.signature_path = signature_path
+        self.seal_path = seal_path
+        self.letterhead = ORG_LETTERHEADS.get(org, ORG_LETTERHEADS["nxtAlign"])
+        self.asset_errors = []
+        assets = [(path, _asset_version(path)) for path in (logo_path, signature_path, seal_path)]
+        self.fingerprint = hashlib.sha256(repr(
+            (TEMPLATE_VERSION, org, self.provisional, activity_type, duration, assets)
+        ).encode("utf-8", "surrogatepass")).hexdigest()
+        self._build()
+
+    # --- drawing ---
+
+    def _draw_header(self, pdf, errors):
+        pdf.set_line_width(0.5)
+        pdf.set_draw_color(255,255,255)
+        pdf.rect(BORDER_MARGIN, BORDER_MARGIN, pdf.w - 2 * BORDER_MARGIN, pdf.h - 2 * BORDER_MARGIN)
+        pdf.set_left_margin(PAGE_MARGIN)
+        pdf.set_right_margin(PAGE_MARGIN)
+
+        current_y = PAGE_MARGIN
+
+        # Logo
+        if self.logo_path and os.path.exists(self.logo_path):
+            try:
+                pdf.image(self.logo_path, x=PAGE_MARGIN, y=current_y, w=35.0)
+            except Exception as e:
+                errors.append(f"Error loading logo image: {e}")
+
+        # Organization header
+        header_width = pdf.w - 2 * PAGE_MARGIN - 40
+        pdf.set_xy(PAGE_MARGIN + 40, current_y)
+        pdf.set_font("Arial", "B", 14)
+        pdf.cell(header_width, 8, self.letterhead["name"], align='R', ln=1)
+        pdf.set_font("Arial", "", 12)
+        pdf.set_x(PAGE_MARGIN + 40)
+        pdf.cell(header_width, 6, self.letterhead["cin"], align='R', ln=1)
+        current_y += 18
+        pdf.set_y(current_y)
+        pdf.ln(8)
+        pdf.set_font("Arial", "", 12)
+        pdf.set_x(PAGE_MARGIN)
+
+    def _draw_id_line(self, pdf, cert_id, end_date_str):
+        pdf.cell(0, 5, f"Certificate ID: {cert_id}", align='L')
+        issued_on_text = f"Issued on: {end_date_str}"
+        text_width = pdf.get_string_width(issued_on_text)
+        pdf.set_xy(pdf.w - PAGE_MARGIN - text_width, pdf.get_y())
+        pdf.cell(text_width, 5, issued_on_text, align='L')
+        pdf.ln(15)
+
+    def _draw_heading(self, pdf):
+        # --- PROVISIONAL exactly above TO WHOMSOEVER ---
+        if self.provisional:
+            pdf.set_font("Arial", "B", 12)
+            pdf.cell(0, 10, "PROVISIONAL CERTIFICATE", align='C', ln=1)
+            pdf.ln(2)  # Small gap
+
+        # Main Heading
+        pdf.set_font("Arial", "B", 14)
+        pdf.cell(0, 10, "TO WHOMSOEVER IT MAY CONCERN", align='C', ln=1)
+        pdf.ln(10)
+        pdf.set_font("Arial", "", 12)
+        pdf.set_x(PAGE_MARGIN)
+
+    def _draw_body(self, pdf, prefix, name, usn, college, start_date_str, end_date_str, topic):
+        effective_width = pdf.w - 2 * PAGE_MARGIN
+        activity = self.activity_type.lower()
+        if self.provisional:
+            para1 = (
+                f"This is to certify {prefix}. {name}, bearing USN No: {usn} from {college}, "
+                f"is currently undergoing a {self.duration} {activity} starting from {start_date_str} "
+                f"to {end_date_str}, under the mentorship of {self.org}'s development team. "
+                f"{name} is working on {topic}.\n\n"
+                f"The domain & agile development process exposure was given along with usage of GitHub tool.\n\n"
+                f"During the {activity}, {name} demonstrated good coding skills with sound design thinking."
+            )
+        else:
+            para1 = (
+                f"This is to certify {prefix}. {name}, bearing USN No: {usn} from {college}, "
+                f"has successfully completed a {self.duration} {activity} starting from {start_date_str} "
+                f"to {end_date_str}, under the mentorship of {self.org}'s development team. "
+                f"{name} has worked on {topic}.\n\n"
+                f"The domain & agile development process exposure was given along with usage of GitHub tool.\n\n"
+                f"During the {activity}, {name} demonstrated good coding skills with sound design thinking."
+            )
+
+        pdf.multi_cell(effective_width, 6, para1, align='J')
+        pdf.ln(6)
+        pdf.set_x(PAGE_MARGIN)
+        para3 = clean_text("We wish all the best for future endeavours!")
+        pdf.multi_cell(effective_width, 6, para3, align='J')
+        return pdf.get_y()
+
+    def _draw_signature_block(self, pdf, y_sign_start, errors):
+        for_text = self.letterhead["for_text"]
+        right_edge = pdf.w - PAGE_MARGIN
+        pdf.set_font("Arial", "", 12)
+        pdf.set_xy(right_edge - pdf.get_string_width(for_text), y_sign_start)
+        pdf.cell(pdf.get_string_width(for_text), 7, for_text, align='L')
+
+        # Seal (left)
+        if self.seal_path and os.path.exists(self.seal_path):
+            try:
+                pdf.image(self.seal_path, x=PAGE_MARGIN, y=y_sign_start, w=30.0)
+            except Exception as e:
+                errors.append(f"Error loading seal image: {e}")
+
+        # Signature (right)
+        sign_height = 0.0
+        sign_y = y_sign_start + 6.0
+        sign_width = 40.0
+        if self.signature_path and os.path.exists(self.signature_path):
+            try:
+                pdf.image(self.signature_path, x=right_edge - sign_width, y=sign_y, w=sign_width)
+                # Size from the image info the PDF already holds, so redrawing
+                # the block for a long body never decodes the image again.
+                signature = pdf.images[self.signature_path]
+                sign_height = (signature["h"] / signature["w"]) * sign_width
+            except Exception as e:
+                errors.append(f"Error loading signature image: {e}")
+
+        # Director label
+        director_y = sign_y + sign_height + 5.0
+        pdf.set_font("Arial", "", 12)
+        director_text_width = pdf.get_string_width("Director")
+        director_x = right_edge - sign_width + (sign_width - director_text_width) / 2
+        pdf.text(director_x, director_y, "Director")
+
+    def _draw_footer(self, pdf):
+        pdf.set_font("Arial", "", 9)
+        pdf.set_y(pdf.h - PAGE_MARGIN - 10)
+        pdf.set_x(0)
+        pdf.cell(0, 5, self.letterhead["footer1"], align='C', ln=1)
+        pdf.cell(0, 5, self.letterhead["footer2"], align='C', ln=1)
+        pdf.cell(0, 5, self.letterhead["footer3"], align='C', ln=1)
+
+    # --- template construction ---
+
+    def _build(self):
+        pdf = CachedImageFPDF(unit='mm', format='A4')
+        pdf.set_auto_page_break(False)
+        pdf.add_page()
+
+        def mark():
+            return len(pdf.pages[1])
+
+        self._draw_header(pdf, self.asset_errors)
+        header_end = mark()
+        self._id_line_xy = (pdf.get_x(), pdf.get_y())
+        self._draw_id_line(pdf, "", "")
+        heading_start = mark()
+        self._draw_heading(pdf)
+        heading_end = mark()
+        self._body_xy = (pdf.get_x(), pdf.get_y())
+        self._draw_body(pdf, "", "", "", "", "", "", "")
+        signature_start = mark()
+        self.min_sign_y = pdf.h - PAGE_MARGIN - 60
+        self._draw_signature_block(pdf, self.min_sign_y, self.asset_errors)
+        signature_end = mark()
+        self._draw_footer(pdf)
+
+        page = pdf.pages[1]
+        self._header_ops = page[:header_end]
+        self._heading_ops = page[heading_start:heading_end]
+        self._signature_ops = page[signature_start:signature_end]
+        self._footer_ops = page[signature_end:]
+        # What a layout-only FPDF needs to emit the same /F and /I references.
+        self._fonts = pdf.fonts
+        self._image_refs = {name: {"i": info["i"], "w": info["w"], "h": info["h"]}
+                            for name, info in pdf.images.items()}
+
+        pdf.output(dest='S')
+        buffer = pdf.buffer
+        content_start = pdf.offsets[4]
+        content_end = pdf.offsets[1]
+        xref_start = buffer.rindex("\nxref\n") + 1
+        date_start = buffer.rindex("/CreationDate (D:", content_end, xref_start)
+        date_end = buffer.index(")", date_start) + 1
+        self._document_head = buffer[:content_start].encode("latin-1")
+        self._objects_before_date = buffer[content_end:date_start].encode("latin-1")
+        self._objects_after_date = buffer[date_end:xref_start].encode("latin-1")
+        self._content_start = content_start
+        self._content_end = content_end
+        self._xref_start = xref_start
+        self._object_count = pdf.n
+        self._offsets = pdf.offsets
+
+        # Serialized objects for MergedCertificatePDF: the page object and
+        # the shared fonts, images and resource dictionary (all but the page
+        # tree 1, page 3, content stream 4, info and catalog).
+        starts = sorted(pdf.offsets.items(), key=lambda item: item[1])
+        ends = [start for _, start in starts[1:]] + [xref_start]
+        objects = {n: buffer[start:end].encode("latin-1") for (n, start), end in zip(starts, ends)}
+        self._page_object = objects[3]
+        self._media_box = re.search(rb"/MediaBox \[[^\]]*\]", objects[1]).group(0)
+        self._shared_objects = {
+            n: data for n, data in objects.items() if n not in (1, 3, 4, pdf.n - 1, pdf.n)
+        }
+
+    def _layout_pdf(self):
+        pdf = CachedImageFPDF(unit='mm', format='A4')
+        pdf.set_auto_page_break(False)
+        pdf.add_page()
+        pdf.set_left_margin(PAGE_MARGIN)
+        pdf.set_right_margin(PAGE_MARGIN)
+        pdf.fonts = dict(self._fonts)
+        pdf.images = dict(self._image_refs)
+        pdf.set_font("Arial", "", 12)
+        return pdf
+
+    # --- rendering ---
+
+    def render(self, prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id):
+        return self.assemble(self.render_content(
+            prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id
+        ))
+
+    def render_content(self, prefix, name, usn, college, start_date_str, end_date_str, topic, cert_id):
+        """Lay out one student's page and return its compressed content stream."""
+        pdf = self._layout_pdf()
+
+        pdf.pages[1] = ""
+        pdf.set_xy(*self._id_line_xy)
+        self._draw_id_line(pdf, cert_id, end_date_str)
+        id_line_ops = pdf.pages[1]
+
+        pdf.pages[1] = ""
+        pdf.set_xy(*self._body_xy)
+        content_end_y = self._draw_body(pdf, prefix, name, usn, college, start_date_str, end_date_str, topic)
+        body_ops = pdf.pages[1]
+
+        # --- Move Seal and Signature Higher ---
+        y_sign_start = max(content_end_y + 10, self.min_sign_y)
+        if y_sign_start == self.min_sign_y:
+            signature_ops = self._signature_ops
+        else:
+            pdf.pages[1] = ""
+            # Images that failed here already failed (and were reported) at build time.
+            self._draw_signature_block(pdf, y_sign_start, [])
+            signature_ops = pdf.pages[1]
+
+        page = (
+            self._header_ops + id_line_ops + self._heading_ops + body_ops
+            + signature_ops + self._footer_ops
+        )
+        return zlib.compress(page.encode("latin-1"))
+
+    def assemble(self, content):
+        """Wrap a content stream from render_content in this template's PDF document."""
+        content_object = (
+            (CONTENT_STREAM_HEADER % (4, len(content))).encode("latin-1")
+            + content + CONTENT_STREAM_FOOTER.encode("latin-1")
+        )
+        shift = self._content_start + len(content_object) - self._content_end
+        creation_date = "/CreationDate (D:" + datetime.now().strftime('%Y%m%d%H%M%S') + ")"
+        xref = ["xref", f"0 {self._object_count + 1}", "0000000000 65535 f "]
+        for i in range(1, self._object_count + 1):
+            offset = self._offsets[i]
+            if offset >= self._content_end:
+                offset += shift
+            xref.append("%010d 00000 n " % offset)
+        xref += [
+            "trailer", "<<",
+            f"/Size {self._object_count + 1}",
+            f"/Root {self._object_count} 0 R",
+            f"/Info {self._object_count - 1} 0 R",
+            ">>", "startxref", str(self._xref_start + shift), "%%EOF", ""
+        ]
+        return (
+            self._document_head + content_object + self._objects_before_date
+            + creation_date.encode("latin-1") + self._objects_after_date
+            + "\n".join(xref).encode("latin-1")
+        )
+
+def _asset_version(path):
+    if path and os.path.exists(path):
+        return os.stat(path).st_mtime_ns
+    return None
+
+@lru_cache(maxsize=64)
+def _cached_template(org, cert_type, activity_type, duration,
+                     logo_path, signature_path, seal_path, asset_versions):
+    return CertificateTemplate(org, cert_type, activity_type, duration,
+                               logo_path, signature_path, seal_path)
+
+def get_certificate_template(org, cert_type, activity_type, duration,
+                             logo_path=None, signature_path=None, seal_path=None):
+    """Return the shared template for this certificate variant, rebuilding it if an asset changed."""
+    if not (cert_type and cert_type.lower() == "provisional"):
+        cert_type = "Final"
+    asset_versions = tuple(_asset_version(p) for p in (logo_path, signature_path, seal_path))
+    return _cached_template(org, cert_type.capitalize(), activity_type, duration,
+                            logo_path, signature_path, seal_path, asset_versions)
+
+# ---------- MERGED BATCH PDF ----------
+# A whole batch as one multi-page PDF, for print shops. The fonts, images and
+# resource dictionary of each template are written once, renumbered into the
+# merged document, the first time one of its pages is added; after that a
+# page costs only its own content stream and page object. Pages are streamed
+# to the file as they come, so memory does not grow with the batch.
+
+_OBJECT_HEADER = re.compile(rb"^(\d+) 0 obj")
+_OBJECT_REFERENCE = re.compile(rb"(\d+) 0 R")
+
+def _renumber(data, numbers):
+    """Rewrite a serialized object's number and references (outside its stream) through `numbers`."""
+    head, sep, stream = data.partition(b"\nstream\n")
+    head = _OBJECT_HEADER.sub(lambda m: b"%d 0 obj" % numbers[int(m.group(1))], head, count=1)
+    head = _OBJECT_REFERENCE.sub(lambda m: b"%d 0 R" % numbers[int(m.group(1))], head)
+    return head + sep + stream
+
+class MergedCertificatePDF:
+    """Writes certificate pages from render_content into one PDF on a binary file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.position = 0
+        self.offsets = {}
+        self.pages = []
+        self._resources = {}
+        self._media_box = None
+        self._next_number = 2  # 1 is the page tree, written by close()
+        self._write(b"%PDF-1.4\n")
+
+    def _write(self, data):
+        self.f.write(data)
+        self.position += len(data)
+
+    def _new_object(self):
+        number = self._next_number
+        self._next_number += 1
+        self.offsets[number] = self.position
+        return number
+
+    def _embed_resources(self, template):
+        numbers = {}
+        for old in template._shared_objects:
+            numbers[old] = self._next_number
+            self._next_number += 1
+        for old, data in template._shared_objects.items():
+            self.offsets[numbers[old]] = self.position
+            self._write(_renumber(data, numbers))
+        if self._media_box is None:
+            self._media_box = template._media_box
+        return numbers[2]
+
+    def add_page(self, template, content):
+        resources = self._resources.get(template.fingerprint)
+        if resources is None:
+            resources = self._resources[template.fingerprint] = self._embed_resources(template)
+        contents = self._new_object()
+        self._write(
+            (CONTENT_STREAM_HEADER % (contents, len(content))).encode("latin-1")
+            + content + CONTENT_STREAM_FOOTER.encode("latin-1")
+        )
+        page = self._new_object()
+        self._write(_renumber(template._page_object, {3: page, 1: 1, 2: resources, 4: contents}))
+        self.pages.append(page)
+
+    def close(self):
+        """Write the page tree, info, catalog and xref; the file itself is left open."""
+        self.offsets[1] = self.position
+        kids = b" ".join(b"%d 0 R" % page for page in self.pages)
+        media_box = self._media_box or b"/MediaBox [0 0 595.28 841.89]"
+        self._write(b"1 0 obj\n<</Type /Pages\n/Kids [%s]\n/Count %d\n%s\n>>\nendobj\n"
+                    % (kids, len(self.pages), media_box))
+        info = self._new_object()
+        self._write((
+            f"{info} 0 obj\n<<\n/Producer (PyFPDF {FPDF_VERSION} http://pyfpdf.googlecode.com/)\n"
+            f"/CreationDate (D:{datetime.now():%Y%m%d%H%M%S})\n>>\nendobj\n"
+        ).encode("latin-1"))
+        catalog = self._new_object()
+        open_action = f"/OpenAction [{self.pages[0]} 0 R /FitH null]\n" if self.pages else ""
+        self._write((
+            f"{catalog} 0 obj\n<<\n/Type /Catalog\n/Pages 1 0 R\n{open_action}/PageLayout /OneColumn\n>>\nendobj\n"
+        ).encode("latin-1"))
+        xref_start = self.position
+        xref = ["xref", f"0 {catalog + 1}", "0000000000 65535 f "]
+        xref += ["%010d 00000 n " % self.offsets[n] for n in range(1, catalog + 1)]
+        xref += [
+            "trailer", "<<", f"/Size {catalog + 1}", f"/Root {catalog} 0 R", f"/Info {info} 0 R",
+            ">>", "startxref", str(xref_start), "%%EOF", ""
+        ]
+        self._write("\n".join(xref).encode("latin-1"))
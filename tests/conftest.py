@@ -0,0 +1,42 @@
+import io
+import zipfile
+
+import pytest
+
+import db
+import pipeline
+
+HEADER = "Prefix,Name,USN,College,Email,Phone,Start Date,End Date,Program,Topic"
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """A fresh SQLite storage backend in place of the configured one."""
+    storage = db.SQLiteStorage(str(tmp_path / "certificates.db"))
+    monkeypatch.setattr(db, "_storage", storage)
+    yield storage
+    storage.engine.dispose()
+
+@pytest.fixture
+def user_id(storage):
+    storage.create_user("alice", "alice@example.com", "x")
+    return storage.find_login("alice")[0]
+
+def make_csv(*rows, college="College"):
+    """CSV bytes for (name, usn) rows of one DLithe batch ending in June 2025."""
+    lines = [HEADER] + [
+        f"Mr,{name},{usn},{college},s{i}@example.com,99999{i:05d},01/06/2025,30/06/2025,Summer Internship,Topic {i}"
+        for i, (name, usn) in enumerate(rows)
+    ]
+    return "\n".join(lines).encode("utf-8")
+
+@pytest.fixture
+def upload(tmp_path, user_id):
+    """Run a CSV through the upload pipeline; returns its summary and the file names in the ZIP."""
+    def upload(data):
+        output = tmp_path / "certificates.zip"
+        summary = pipeline.generate_certificates_from_csv(
+            io.BytesIO(data), str(output), user_id, "DLithe", "Web Development",
+            "Internship", "Internship", "1 month", workers=1
+        )
+        return summary, sorted(zipfile.ZipFile(output).namelist())
+    return upload
@@ -0,0 +1,70 @@
+import hashlib
+import time
+
+import pytest
+
+import auth
+
+@pytest.fixture(autouse=True)
+def fresh_epochs(monkeypatch):
+    monkeypatch.setattr(auth, "_session_epochs", {})
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_800_000_000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+def test_token_round_trip():
+    assert auth.verify_session_token(auth.issue_session_token("alice", 1)) == ("alice", 1)
+
+def test_tampered_token_is_rejected():
+    payload, _, signature = auth.issue_session_token("alice", 1).partition(".")
+    other_payload = auth.issue_session_token("mallory", 2).partition(".")[0]
+    assert auth.verify_session_token(f"{payload}.{signature[:-2]}xx") is None
+    assert auth.verify_session_token(f"{other_payload}.{signature}") is None
+    assert auth.verify_session_token("junk") is None
+    assert auth.verify_session_token(None) is None
+
+def test_expired_token_is_rejected(clock):
+    token = auth.issue_session_token("alice", 1, ttl_seconds=60)
+    clock[0] += 60
+    assert auth.verify_session_token(token) == ("alice", 1)
+    clock[0] += 1
+    assert auth.verify_session_token(token) is None
+    assert auth.renew_session_token(token, ttl_seconds=60) is None
+
+def test_revoke_sessions_rejects_earlier_tokens_only():
+    old = auth.issue_session_token("alice", 1)
+    other = auth.issue_session_token("bob", 2)
+    auth.revoke_sessions(1)
+    assert auth.verify_session_token(old) is None
+    assert auth.renew_session_token(old) is None
+    assert auth.verify_session_token(other) == ("bob", 2)
+    assert auth.verify_session_token(auth.issue_session_token("alice", 1)) == ("alice", 1)
+
+def test_token_is_renewed_from_half_its_lifetime(clock):
+    token = auth.issue_session_token("alice", 1, ttl_seconds=100)
+    clock[0] += 49
+    assert auth.renew_session_token(token, ttl_seconds=100) is None
+    clock[0] += 1
+    renewed = auth.renew_session_token(token, ttl_seconds=100)
+    assert renewed is not None and renewed != token
+    clock[0] += 99
+    assert auth.verify_session_token(token) is None
+    assert auth.verify_session_token(renewed) == ("alice", 1)
+
+def test_sha256_hash_is_upgraded_to_scrypt_on_login(storage, monkeypatch):
+    monkeypatch.setattr(auth, "SCRYPT_N", 2 ** 10)
+    storage.create_user("carol", "carol@example.com", hashlib.sha256(b"secret").hexdigest())
+    user_id = storage.find_login("carol")[0]
+
+    assert auth.authenticate("carol", "wrong") is None
+    assert not storage.find_login("carol")[1].startswith("scrypt$")
+
+    assert auth.authenticate("carol", "secret") == user_id
+    stored = storage.find_login("carol")[1]
+    assert stored.startswith(f"scrypt${2 ** 10}$")
+    assert auth.authenticate("carol", "secret") == user_id
+    assert storage.find_login("carol")[1] == stored
+    assert auth.authenticate("carol", "wrong") is None
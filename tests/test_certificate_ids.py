@@ -0,0 +1,58 @@
+from sqlalchemy import event
+
+import db
+import pipeline
+from conftest import make_csv
+
+def stored_ids():
+    return sorted(row["certificate_id"] for row in db.get_storage().existing_certificates(
+        "DLithe", [f"DLWD{usn}JUN25{suffix}" for usn in ("101", "101.0", "103", "103.0", "nan", "None")
+                   for suffix in ("", "-2", "-3")]
+    ).values())
+
+def test_reupload_with_numeric_usns_and_a_blank_is_unchanged(upload):
+    # The blank cell makes pandas read the USN column as float.
+    data = make_csv(("Asha", 101), ("Ravi", ""), ("Meera", 103))
+    first, _ = upload(data)
+    assert first["inserted"] == 3
+    ids = stored_ids()
+    assert len(ids) == 3
+
+    second, files = upload(data)
+    assert (second["inserted"], second["updated"], second["unchanged"]) == (0, 0, 3)
+    assert files == []
+    assert stored_ids() == ids
+
+def test_repeated_id_in_a_batch_gets_a_suffix(upload):
+    summary, _ = upload(make_csv(("Asha", 101), ("Ravi", 101), ("Meera", 101)))
+    assert summary["inserted"] == 3
+    assert stored_ids() == ["DLWD101JUN25", "DLWD101JUN25-2", "DLWD101JUN25-3"]
+
+def test_id_stored_for_another_intern_is_skipped_and_own_id_reused(upload):
+    upload(make_csv(("Asha", ""), ("Ravi", "")))
+    assert stored_ids() == ["DLWDnanJUN25", "DLWDnanJUN25-2"]
+
+    summary, _ = upload(make_csv(("Meera", ""), ("Ravi", "")))
+    assert (summary["inserted"], summary["unchanged"]) == (1, 1)
+    assert stored_ids() == ["DLWDnanJUN25", "DLWDnanJUN25-2", "DLWDnanJUN25-3"]
+
+def test_blank_usns_are_numbered_with_a_bounded_number_of_queries(upload):
+    upload(make_csv(("Asha", ""), ("Ravi", ""), ("Meera", "")))
+    statements = []
+    event.listen(db.get_storage().engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    base = "DLWDnanJUN25"
+    allocator = pipeline.CertificateIdAllocator("DLithe")
+    ids = []
+    for chunk in range(3):
+        keys = [("name", f"intern {chunk * 1000 + i}") for i in range(1000)]
+        if chunk == 1:
+            keys[500] = ("name", "ravi")
+        chunk_ids, existing = allocator.assign([base] * 1000, keys)
+        ids += chunk_ids
+        assert list(existing) == (["DLWDnanJUN25-2"] if chunk == 1 else [])
+
+    assert len([statement for statement in statements if statement.startswith("SELECT")]) == 2
+    assert ids[1500] == "DLWDnanJUN25-2"
+    assert len(set(ids)) == 3000
+    assert set(ids) - {ids[1500]} == {f"{base}-{suffix}" for suffix in range(4, 3003)}
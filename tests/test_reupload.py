@@ -0,0 +1,52 @@
+from sqlalchemy import text
+
+import db
+from conftest import make_csv
+
+def approve_all():
+    with db.get_storage().engine.begin() as conn:
+        conn.execute(text("UPDATE certificate_data_DLithe SET status = 'Review_Completed'"))
+
+def forget_hashes():
+    # As rows stored before content hashes were.
+    with db.get_storage().engine.begin() as conn:
+        conn.execute(text("UPDATE certificate_data_DLithe SET content_hash = NULL"))
+
+def rows():
+    with db.get_storage().engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT name, college, status, content_hash IS NOT NULL AS hashed FROM certificate_data_DLithe ORDER BY name"
+        )).all()
+
+def test_changed_row_goes_back_to_review_and_is_exported_again(upload, user_id):
+    storage = db.get_storage()
+    upload(make_csv(("Asha", 101), ("Ravi", 102)))
+    approve_all()
+    exported = [row["certificate_id"] for row in storage.approved_certificates(user_id, "DLithe", new_only=True)]
+    storage.mark_certificates_exported(user_id, "DLithe", exported)
+    assert storage.approved_certificates(user_id, "DLithe", new_only=True) == []
+
+    summary, _ = upload(make_csv(("Asha", 101), ("Ravi", 102), college="Other College"))
+    assert summary["updated"] == 2
+    approve_all()
+    assert len(storage.approved_certificates(user_id, "DLithe", new_only=True)) == 2
+
+def test_unchanged_row_from_before_hashes_keeps_its_status(upload, user_id):
+    storage = db.get_storage()
+    upload(make_csv(("Asha", 101)))
+    approve_all()
+    storage.mark_certificates_exported(user_id, "DLithe", ["DLWD101JUN25"])
+    forget_hashes()
+
+    upload(make_csv(("Asha", 101)))
+    assert rows() == [("Asha", "College", "Review_Completed", 1)]
+    assert storage.approved_certificates(user_id, "DLithe", new_only=True) == []
+
+def test_changed_row_from_before_hashes_goes_back_to_review(upload, user_id):
+    upload(make_csv(("Asha", 101)))
+    approve_all()
+    forget_hashes()
+
+    upload(make_csv(("Asha", 101), college="Forged College"))
+    assert rows() == [("Asha", "Forged College", "pending_review", 1)]
+    assert db.get_storage().approved_certificates(user_id, "DLithe") == []
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import db
+
+# ---------- CERTIFICATE VERIFICATION ----------
+# Third parties check the certificate IDs printed on the PDFs. Each lookup
+# is a unique-index probe per org table, and recent answers (misses too) are
+# kept in an in-process LRU for VERIFY_CACHE_TTL_SECONDS, so bursts of
+# verification traffic mostly never reach the database. The TTL bounds how
+# long a status change (e.g. a review being completed) takes to show up.
+
+VERIFY_CACHE_SIZE = int(os.environ.get("CERT_VERIFY_CACHE_SIZE", "4096"))
+VERIFY_CACHE_TTL_SECONDS = float(os.environ.get("CERT_VERIFY_CACHE_TTL_SECONDS", "60"))
+
+class LookupCache:
+    def __init__(self, maxsize=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) for a fresh entry, else (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+verification_cache = LookupCache()
+
+def _lookup_order(certificate_id, orgs):
+    # generate_certificate_id starts nxtAlign IDs with NXT and the others
+    # with DL, so the matching table is probed first.
+    nxt = certificate_id.upper().startswith("NXT")
+    return sorted(orgs, key=lambda org: (str(org).lower() == "nxtalign") != nxt)
+
+def verify_certificate(certificate_id, orgs):
+    """Look a certificate ID up across the org tables; returns its record (with "org") or None."""
+    certificate_id = certificate_id.strip()
+    if not certificate_id:
+        return None
+    hit, record = verification_cache.get(certificate_id)
+    if not hit:
+        record = db.get_storage().find_certificate(certificate_id, _lookup_order(certificate_id, orgs))
+        verification_cache.put(certificate_id, record)
+    return record